@@ -0,0 +1,361 @@
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Annotated
+
+import httpx
+import orjson
+import tomli
+import typer
+from loguru import logger
+
+from FumblerLibrary.Benchmark.FixtureGame import FixtureGame
+from FumblerLibrary.Benchmark.MockServer import MockOptions, run_server
+from FumblerLibrary.FumblerModels import TomlConfig
+from FumblerLibrary.LibraryMain import process_rpgmaker
+from FumblerLibrary.StageProfiler import peak_rss, stages
+
+app = typer.Typer()
+main_dir = pathlib.Path(__file__).resolve().parent
+
+
+def benchmark_config(
+    config_file: pathlib.Path,
+    host: str,
+    concurrency: int | None,
+    chat: bool,
+    workers: int | None = None,
+) -> TomlConfig:
+    raw = tomli.loads(config_file.read_text(encoding="utf-8"))
+    raw["api"].update(key="benchmark", host=host, model="mock")
+    if concurrency:
+        raw["api"]["concurrency"] = concurrency
+    if workers is not None:
+        raw.setdefault("pipeline", {})["workers"] = workers
+    raw["prompts"].setdefault("source_lang", "Japanese")
+    raw["prompts"].setdefault("dest_lang", "English")
+    if chat:
+        raw["prompts"].pop("template", None)
+    # Every run has to hit the server. Short backoff keeps fault injection runs quick.
+    raw["cache"] = {"enabled": False}
+    raw.setdefault("retry", {}).update(base_delay=0.05, max_delay=0.5)
+    config = TomlConfig(**raw)
+    config.prompts.db = tomli.loads(
+        (main_dir / "knowledge_db.example.toml").read_text(encoding="utf-8")
+    )["db"]
+    config.prompts.samples = orjson.loads(
+        (main_dir / "sample.json").read_text(encoding="utf-8")
+    )
+    return config
+
+
+def count_lines(files: list[pathlib.Path], config: TomlConfig) -> int:
+    from FumblerLibrary.Parsers.RPGMVMZ.GameParser import MVMZParser
+
+    parser = MVMZParser(files, config)
+    lines = 0
+    for file in files:
+        parsed = parser.load_file(file)
+        if parsed is None:
+            continue
+        for container in parser.prepare_tl_containers(parsed) or []:
+            if container:
+                lines += len(container.data)
+    return lines
+
+
+def rss_mb(peak: int) -> float | None:
+    if not peak:
+        return None
+    # Bytes on macOS, KB everywhere else.
+    return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+
+def peak_rss_mb() -> float | None:
+    peak = peak_rss()
+    if not peak:
+        logger.warning("Peak RSS is not available on this platform.")
+    return rss_mb(peak)
+
+
+@app.command(name="run")
+def run(
+    maps: Annotated[int, typer.Option(help="Maps in the fixture game.")] = 4,
+    events: Annotated[int, typer.Option(help="Events per map.")] = 8,
+    messages: Annotated[int, typer.Option(help="Messages per event page.")] = 16,
+    seed: Annotated[int, typer.Option(help="Seed for the fixture and the faults.")] = 0,
+    token_latency: Annotated[
+        float, typer.Option(help="Seconds per streamed token.")
+    ] = 0.002,
+    ttft: Annotated[float, typer.Option(help="Seconds to the first token.")] = 0.05,
+    error_rate: Annotated[float, typer.Option(help="Chance of a 500.")] = 0.0,
+    garbage_rate: Annotated[
+        float, typer.Option(help="Chance of a non-json response.")
+    ] = 0.0,
+    drop_rate: Annotated[
+        float, typer.Option(help="Chance of a stream being cut off.")
+    ] = 0.0,
+    concurrency: Annotated[
+        int | None, typer.Option(help="Overrides api.concurrency.")
+    ] = None,
+    chat: Annotated[
+        bool, typer.Option("--chat", help="Use chat completions (no template).")
+    ] = False,
+    workers: Annotated[
+        int | None, typer.Option(help="Overrides pipeline.workers.")
+    ] = None,
+    config_file: Annotated[
+        pathlib.Path, typer.Option("--config", help="Config to benchmark with.")
+    ] = main_dir / "config.featherless.example.toml",
+    report: Annotated[
+        pathlib.Path | None, typer.Option(help="Write the results as json.")
+    ] = None,
+    log_level: Annotated[str, typer.Option(help="Pipeline log level.")] = "WARNING",
+):
+    """Runs the rpgmaker pipeline over a fixture game against a local mock server."""
+    logger.remove()
+    logger.add(sys.stderr, level=log_level)
+    options = MockOptions(
+        token_latency=token_latency,
+        ttft=ttft,
+        error_rate=error_rate,
+        garbage_rate=garbage_rate,
+        drop_rate=drop_rate,
+        seed=seed,
+    )
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    server = multiprocessing.Process(
+        target=run_server,
+        args=(options.model_dump(), "127.0.0.1", 0, sender),
+        daemon=True,
+    )
+    server.start()
+    try:
+        if not receiver.poll(30):
+            raise RuntimeError("Mock server did not start.")
+        port = receiver.recv()
+        host = f"http://127.0.0.1:{port}/v1/"
+        config = benchmark_config(config_file, host, concurrency, chat, workers)
+        with tempfile.TemporaryDirectory(prefix="fumbler-bench-") as temp:
+            temp_dir = pathlib.Path(temp)
+            files = FixtureGame(maps, events, messages, seed=seed).write(
+                temp_dir / "inputs"
+            )
+            lines = count_lines(files, config)
+            output_folder = temp_dir / "outputs"
+            output_folder.mkdir()
+
+            started = time.perf_counter()
+            asyncio.run(process_rpgmaker(files, output_folder, config))
+            elapsed = time.perf_counter() - started
+            # Reported by the stage worker processes along with their spans.
+            workers_peak_rss_mb = rss_mb(stages.merged_peak_rss)
+
+            metrics_file = output_folder / "rpgmaker_metrics.json"
+            outcomes = (
+                orjson.loads(metrics_file.read_bytes())["total"]["outcomes"]
+                if metrics_file.exists()
+                else {}
+            )
+            dead_letter = output_folder / "rpgmaker_dead_letter.jsonl"
+            failed_chunks = (
+                len(dead_letter.read_bytes().splitlines()) if dead_letter.exists() else 0
+            )
+        stats = httpx.get(f"http://127.0.0.1:{port}/stats").json()
+    finally:
+        server.terminate()
+        server.join()
+
+    results = {
+        "fixture": {"maps": maps, "events": events, "messages": messages, "seed": seed},
+        "server": options.model_dump(),
+        "backend": "chat" if chat else "completions",
+        "concurrency": config.api.concurrency,
+        "workers": config.pipeline.workers,
+        "lines": lines,
+        "seconds": round(elapsed, 3),
+        "lines_per_s": round(lines / elapsed, 2),
+        "requests": stats["requests"],
+        "requests_per_s": round(stats["requests"] / elapsed, 2),
+        # Requests resending lines (re-requests and retries after failures).
+        "retried_requests": stats["retried_requests"],
+        # Connections the server accepted. Requests above this reused an open connection.
+        "connections": stats["connections"],
+        "failed_chunks": failed_chunks,
+        # Request outcomes as classified by the translator (ok, network, dropped, ...).
+        "outcomes": outcomes,
+        "peak_rss_mb": peak_rss_mb(),
+        # Largest stage worker process. None when the stages run in threads (--workers 0).
+        "workers_peak_rss_mb": workers_peak_rss_mb,
+        "mock": stats,
+    }
+    for key in (
+        "lines",
+        "seconds",
+        "lines_per_s",
+        "requests",
+        "requests_per_s",
+        "retried_requests",
+        "connections",
+        "failed_chunks",
+        "peak_rss_mb",
+        "workers_peak_rss_mb",
+    ):
+        typer.echo(f"{key:>19}: {results[key]}")
+    typer.echo(f"{'outcomes':>19}: {outcomes}")
+    if report:
+        report.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+    # Every stream the mock cut off has to be classified as dropped, not as a network error.
+    if outcomes.get("dropped", 0) != stats["dropped"]:
+        typer.echo(
+            f"Mock dropped {stats['dropped']} streams, "
+            f"{outcomes.get('dropped', 0)} were classified as dropped."
+        )
+        raise typer.Exit(1)
+
+
+def interp_stages(parser, file: pathlib.Path):
+    """Load, decompile (prepare) and compile (apply every line) a file once."""
+    timings = {}
+    started = time.perf_counter()
+    parsed = parser.load_file(file)
+    timings["load"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    containers = parser.prepare_tl_containers(parsed)
+    timings["decompile"] = time.perf_counter() - started
+
+    for container in containers:
+        if container:
+            # Every line "changes" so every list is recompiled.
+            container.translated = dict(container.data)
+    started = time.perf_counter()
+    parser.apply_tl_containers(parsed, containers)
+    timings["compile"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    orjson.dumps(parser.dump_data(parsed))
+    timings["dump"] = time.perf_counter() - started
+    return timings
+
+
+@app.command(name="interp")
+def interp(
+    common_events: Annotated[
+        int, typer.Option(help="Common events in the fixture.")
+    ] = 400,
+    messages: Annotated[int, typer.Option(help="Messages per common event.")] = 64,
+    rounds: Annotated[int, typer.Option(help="Timed rounds (best is kept).")] = 3,
+    seed: Annotated[int, typer.Option(help="Seed for the fixture.")] = 0,
+    config_file: Annotated[
+        pathlib.Path, typer.Option("--config", help="Config to benchmark with.")
+    ] = main_dir / "config.featherless.example.toml",
+    report: Annotated[
+        pathlib.Path | None, typer.Option(help="Write the results as json.")
+    ] = None,
+):
+    """Measures event decompile/compile throughput and memory over a large CommonEvents.json.
+
+    Runs locally, no server is needed.
+    """
+    from FumblerLibrary.Parsers.RPGMVMZ.GameParser import MVMZParser
+
+    logger.remove()
+    config = benchmark_config(config_file, "http://127.0.0.1/v1/", None, False)
+    # The parser's progress bars would drown out the results.
+    with tempfile.TemporaryDirectory(
+        prefix="fumbler-bench-"
+    ) as temp, contextlib.redirect_stderr(io.StringIO()):
+        # Messages are doubled for common events by the fixture.
+        fixture = FixtureGame(
+            maps=0, common_events=common_events, messages=messages // 2, seed=seed
+        )
+        file = pathlib.Path(temp) / "CommonEvents.json"
+        file.write_bytes(orjson.dumps(fixture.common_events_file()))
+        commands = sum(
+            len(event["list"]) for event in orjson.loads(file.read_bytes()) if event
+        )
+        parser = MVMZParser([file], config)
+
+        best: dict[str, float] = {}
+        for _ in range(rounds):
+            for stage, seconds in interp_stages(parser, file).items():
+                best[stage] = min(best.get(stage, seconds), seconds)
+
+        # Memory held by the loaded file, then by the kept decompiled events on top of it.
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        parsed = parser.load_file(file)
+        loaded = tracemalloc.get_traced_memory()[0] - baseline
+        containers = parser.prepare_tl_containers(parsed)
+        prepared = tracemalloc.get_traced_memory()[0] - baseline
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+        del parsed, containers
+
+    results = {
+        "fixture": {"common_events": common_events, "messages": messages, "seed": seed},
+        "commands": commands,
+        "seconds": {stage: round(seconds, 4) for stage, seconds in best.items()},
+        "commands_per_s": {
+            stage: round(commands / seconds) for stage, seconds in best.items()
+        },
+        "loaded_mb": round(loaded / 1024 / 1024, 2),
+        "prepared_mb": round(prepared / 1024 / 1024, 2),
+        "peak_mb": round(peak / 1024 / 1024, 2),
+    }
+    typer.echo(f"{'commands':>18}: {commands}")
+    for stage, seconds in best.items():
+        typer.echo(
+            f"{stage + ' s':>18}: {seconds:.4f} ({results['commands_per_s'][stage]} commands/s)"
+        )
+    for key in ("loaded_mb", "prepared_mb", "peak_mb"):
+        typer.echo(f"{key:>19}: {results[key]}")
+    typer.echo(f"{'outcomes':>19}: {outcomes}")
+    if report:
+        report.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+    # Every stream the mock cut off has to be classified as dropped, not as a network error.
+    if outcomes.get("dropped", 0) != stats["dropped"]:
+        typer.echo(
+            f"Mock dropped {stats['dropped']} streams, "
+            f"{outcomes.get('dropped', 0)} were classified as dropped."
+        )
+        raise typer.Exit(1)
+
+
+@app.command(name="compare")
+def compare(
+    baseline: pathlib.Path,
+    current: pathlib.Path,
+    tolerance: Annotated[
+        float, typer.Option(help="Allowed lines/s regression (0.1 = 10%).")
+    ] = 0.1,
+):
+    """Compares two `run --report` results. Exits with 1 if lines/s regressed past the tolerance."""
+    before = orjson.loads(baseline.read_bytes())
+    after = orjson.loads(current.read_bytes())
+    for key in (
+        "lines_per_s",
+        "requests_per_s",
+        "retried_requests",
+        "peak_rss_mb",
+        "workers_peak_rss_mb",
+    ):
+        old, new = before.get(key), after.get(key)
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        typer.echo(f"{key:>19}: {old} -> {new} ({change})")
+    if after["lines_per_s"] < before["lines_per_s"] * (1 - tolerance):
+        typer.echo("lines/s regressed.")
+        raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
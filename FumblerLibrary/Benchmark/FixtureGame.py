@@ -0,0 +1,192 @@
+import pathlib
+import random
+
+import orjson
+
+LINES = [
+    "「こんにちは！」",
+    "…？！",
+    "いらっしゃいませ",
+    "今日はいい天気ですね。",
+    "「エリー様、どこですか？」",
+    "ありがとうございます。",
+    "さようなら",
+    "この先は危険だ。気をつけて。",
+    "「カルタ、\nアミさんを見かけましたか？」",
+]
+CHOICES = [["はい", "いいえ"], ["買う", "売る", "やめる"]]
+
+
+class FixtureGame:
+    """Generates a synthetic RPG Maker MV/MZ game for benchmarks.
+
+    Lines are numbered so that most of them are unique (like a real game). The same seed always
+    gives the same game.
+    """
+
+    def __init__(
+        self,
+        maps: int = 4,
+        events: int = 8,
+        messages: int = 16,
+        common_events: int = 8,
+        items: int = 40,
+        seed: int = 0,
+    ) -> None:
+        self.maps = maps
+        self.events = events
+        self.messages = messages
+        self.common_events = common_events
+        self.items = items
+        self.random = random.Random(seed)
+        self.counter = 0
+
+    def line(self) -> str:
+        self.counter += 1
+        return f"{self.random.choice(LINES)}{self.counter}"
+
+    def event_list(self, messages: int, mz: bool) -> list[dict]:
+        commands = []
+        for idx in range(messages):
+            face = ["Actor1", 0, 0, 2]
+            if mz:
+                face.append("エリー")
+            commands.append({"code": 101, "indent": 0, "parameters": face})
+            commands.append({"code": 401, "indent": 0, "parameters": [self.line()]})
+            if idx % 4 == 3:
+                choices = self.random.choice(CHOICES)
+                commands.append(
+                    {"code": 102, "indent": 0, "parameters": [choices, 1, 0, 2, 0]}
+                )
+                for choice_idx, choice in enumerate(choices):
+                    commands.append(
+                        {"code": 402, "indent": 0, "parameters": [choice_idx, choice]}
+                    )
+                    commands.append({"code": 0, "indent": 1, "parameters": []})
+                commands.append({"code": 404, "indent": 0, "parameters": []})
+        commands.append({"code": 0, "indent": 0, "parameters": []})
+        return commands
+
+    def page(self, messages: int, mz: bool) -> dict:
+        return {
+            "conditions": {},
+            "directionFix": False,
+            "image": {},
+            "list": self.event_list(messages, mz),
+            "moveFrequency": 3,
+            "moveRoute": {
+                "list": [{"code": 0, "parameters": []}],
+                "repeat": True,
+                "skippable": False,
+                "wait": False,
+            },
+            "moveSpeed": 3,
+            "moveType": 0,
+            "priorityType": 1,
+            "stepAnime": False,
+            "through": False,
+            "trigger": 0,
+            "walkAnime": True,
+        }
+
+    def map_file(self, map_idx: int) -> dict:
+        width, height = 20, 15
+        # Every other map uses MZ style speaker names.
+        mz = map_idx % 2 == 0
+        events = [None]
+        for event_idx in range(1, self.events + 1):
+            events.append(
+                {
+                    "id": event_idx,
+                    "name": f"EV{event_idx:03}",
+                    "note": "",
+                    "pages": [
+                        self.page(self.messages, mz),
+                        self.page(max(self.messages // 4, 1), mz),
+                    ],
+                    "x": event_idx % width,
+                    "y": event_idx // width,
+                }
+            )
+        return {
+            "autoplayBgm": False,
+            "autoplayBgs": False,
+            "battleback1Name": "",
+            "battleback2Name": "",
+            "bgm": {},
+            "bgs": {},
+            "disableDashing": False,
+            "displayName": "",
+            "encounterList": [],
+            "encounterStep": 30,
+            "height": height,
+            "note": "",
+            "parallaxLoopX": False,
+            "parallaxLoopY": False,
+            "parallaxName": "",
+            "parallaxShow": True,
+            "parallaxSx": 0,
+            "parallaxSy": 0,
+            "scrollType": 0,
+            "specifyBattleback": False,
+            "tilesetId": 1,
+            "width": width,
+            "data": [0] * (width * height * 6),
+            "events": events,
+        }
+
+    def common_events_file(self) -> list:
+        return [None] + [
+            {
+                "id": idx,
+                "list": self.event_list(self.messages * 2, False),
+                "name": f"CE{idx:03}",
+                "switchId": 1,
+                "trigger": 0,
+            }
+            for idx in range(1, self.common_events + 1)
+        ]
+
+    def items_file(self) -> list:
+        return [None] + [
+            {
+                "id": idx,
+                "animationId": 0,
+                "consumable": True,
+                "damage": {},
+                "description": f"体力を回復する薬。{idx}",
+                "effects": [],
+                "hitType": 0,
+                "iconIndex": 1,
+                "itypeId": 1,
+                "name": f"ポーション{idx}",
+                "note": "",
+                "occasion": 0,
+                "price": 10,
+                "repeats": 1,
+                "scope": 7,
+                "speed": 0,
+                "successRate": 100,
+                "tpGain": 0,
+            }
+            for idx in range(1, self.items + 1)
+        ]
+
+    def write(self, folder: pathlib.Path) -> list[pathlib.Path]:
+        """Writes the game's data files into the folder.
+
+        Returns:
+            list[pathlib.Path]: The written files.
+        """
+        folder.mkdir(parents=True, exist_ok=True)
+        files: dict[str, object] = {
+            f"Map{map_idx:03}.json": self.map_file(map_idx)
+            for map_idx in range(1, self.maps + 1)
+        }
+        files["CommonEvents.json"] = self.common_events_file()
+        files["Items.json"] = self.items_file()
+        written = []
+        for name, data in files.items():
+            (folder / name).write_bytes(orjson.dumps(data))
+            written.append(folder / name)
+        return written
@@ -0,0 +1,251 @@
+import asyncio
+import random
+import re
+import time
+from typing import Any
+
+import orjson
+import pydantic
+from loguru import logger
+
+# Same as the translator. Anything matching is replaced so the echo passes validation.
+JP_regex = re.compile(r"[一-龠]+|[ぁ-ゔ]+|[ァ-ヴー]+")
+JSON_block = re.compile(r"```json\n(.*?)\n```", flags=re.DOTALL)
+
+
+class MockOptions(pydantic.BaseModel):
+    # Seconds per streamed token (a token is ~4 characters here).
+    token_latency: float = 0.002
+    # Seconds before the first token.
+    ttft: float = 0.05
+    # Chance of a 500 response.
+    error_rate: float = 0.0
+    # Chance of a response that is not json at all.
+    garbage_rate: float = 0.0
+    # Chance of the connection being closed mid-stream.
+    drop_rate: float = 0.0
+    chars_per_token: int = 4
+    seed: int = 0
+
+
+class MockStats(pydantic.BaseModel):
+    requests: int = 0
+    # Requests containing lines that were already requested before.
+    retried_requests: int = 0
+    lines: int = 0
+    errors: int = 0
+    garbage: int = 0
+    dropped: int = 0
+    connections: int = 0
+
+
+class MockServer:
+    """Offline stand-in for an OpenAI compatible completions server.
+
+    Serves `/v1/completions` and `/v1/chat/completions` (streamed) by echoing the last ```json block
+    of the request with the Japanese replaced, so every response is a valid translation. Latency,
+    errors, garbage and dropped streams are injected according to `MockOptions`.
+    `GET /stats` returns `MockStats`.
+    """
+
+    def __init__(self, options: MockOptions) -> None:
+        self.options = options
+        self.random = random.Random(options.seed)
+        self.stats = MockStats()
+        self.seen: set[bytes] = set()
+
+    @staticmethod
+    def translate(value: Any):
+        if isinstance(value, str):
+            return JP_regex.sub("tl", value)
+        elif isinstance(value, list):
+            return [MockServer.translate(i) for i in value]
+        elif isinstance(value, dict):
+            return {k: MockServer.translate(v) for k, v in value.items()}
+        return value
+
+    def source_chunk(self, body: dict) -> dict:
+        if "messages" in body:
+            text = body["messages"][-1]["content"]
+        else:
+            text = body["prompt"]
+        blocks = JSON_block.findall(text)
+        if not blocks:
+            return {}
+        chunk = orjson.loads(blocks[-1])
+        retried = False
+        for key, value in chunk.items():
+            line = orjson.dumps([key, value])
+            if line in self.seen:
+                retried = True
+            self.seen.add(line)
+        self.stats.lines += len(chunk)
+        if retried:
+            self.stats.retried_requests += 1
+        return chunk
+
+    def completion_text(self, body: dict) -> str:
+        chunk = self.source_chunk(body)
+        if self.random.random() < self.options.garbage_rate:
+            self.stats.garbage += 1
+            return "I'm sorry, I can't help with translating this text."
+        translated = orjson.dumps(
+            self.translate(chunk), option=orjson.OPT_INDENT_2
+        ).decode()
+        if "messages" not in body:
+            # Continues the "```json" the translator ends its prompt with.
+            return f"\n{translated}\n```"
+        if any(
+            body.get(k) for k in ("response_format", "guided_json", "json_schema")
+        ):
+            return translated
+        return f"```json\n{translated}\n```"
+
+    @staticmethod
+    def event(body: dict, piece: str) -> bytes:
+        if "messages" in body:
+            event = {
+                "id": "mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [
+                    {"index": 0, "delta": {"content": piece}, "finish_reason": None}
+                ],
+            }
+        else:
+            event = {
+                "id": "mock",
+                "object": "text_completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [
+                    {"index": 0, "text": piece, "finish_reason": None, "logprobs": None}
+                ],
+            }
+        return b"data: " + orjson.dumps(event) + b"\n\n"
+
+    def usage_event(self, body: dict, text: str) -> bytes:
+        if "messages" in body:
+            prompt = "".join(message["content"] for message in body["messages"])
+        else:
+            prompt = body["prompt"]
+        step = self.options.chars_per_token
+        prompt_tokens = len(prompt) // step + 1
+        completion_tokens = len(text) // step + 1
+        event = {
+            "id": "mock",
+            "object": "chat.completion.chunk" if "messages" in body else "text_completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+        return b"data: " + orjson.dumps(event) + b"\n\n"
+
+    @staticmethod
+    def http_chunk(data: bytes) -> bytes:
+        return b"%x\r\n%s\r\n" % (len(data), data)
+
+    async def respond_json(
+        self, writer: asyncio.StreamWriter, status: str, data: dict
+    ):
+        payload = orjson.dumps(data)
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n".encode()
+            + payload
+        )
+        await writer.drain()
+
+    async def respond_stream(self, writer: asyncio.StreamWriter, body: dict) -> bool:
+        """Streams a completion. Returns False if the connection was dropped on purpose."""
+        text = self.completion_text(body)
+        drop_at = -1
+        if self.random.random() < self.options.drop_rate:
+            drop_at = self.random.randrange(max(len(text), 1))
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        await asyncio.sleep(self.options.ttft)
+        step = self.options.chars_per_token
+        for idx in range(0, len(text), step):
+            if 0 <= drop_at < idx + step:
+                self.stats.dropped += 1
+                await writer.drain()
+                writer.close()
+                return False
+            writer.write(self.http_chunk(self.event(body, text[idx : idx + step])))
+            await writer.drain()
+            if self.options.token_latency:
+                await asyncio.sleep(self.options.token_latency)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            writer.write(self.http_chunk(self.usage_event(body, text)))
+        writer.write(self.http_chunk(b"data: [DONE]\n\n") + b"0\r\n\r\n")
+        await writer.drain()
+        return True
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = header.decode().split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                raw = await reader.readexactly(length) if length else b""
+                if method == "GET" and path.rstrip("/").endswith("/stats"):
+                    await self.respond_json(writer, "200 OK", self.stats.model_dump())
+                    continue
+                if method != "POST" or not path.rstrip("/").endswith("completions"):
+                    await self.respond_json(
+                        writer, "404 Not Found", {"error": {"message": "Not found"}}
+                    )
+                    continue
+                body = orjson.loads(raw)
+                self.stats.requests += 1
+                if self.random.random() < self.options.error_rate:
+                    self.stats.errors += 1
+                    await self.respond_json(
+                        writer,
+                        "500 Internal Server Error",
+                        {"error": {"message": "Injected error", "type": "server_error"}},
+                    )
+                    continue
+                if not await self.respond_stream(writer, body):
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.exception(f"Mock server failed: {e}")
+        writer.close()
+
+    async def serve(self, host: str, port: int, ready=None):
+        server = await asyncio.start_server(self.handle, host, port)
+        if ready is not None:
+            ready.send(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+
+def run_server(options: dict, host: str, port: int, ready=None):
+    """Entry point for running the server in its own process.
+
+    Args:
+        options (dict): `MockOptions` fields.
+        ready: Pipe connection the bound port is sent through once listening.
+    """
+    asyncio.run(MockServer(MockOptions(**options)).serve(host, port, ready))
@@ -0,0 +1,37 @@
+import asyncio
+
+
+class FileBudget:
+    """Caps how many parsed files (and how many bytes of them) are held in memory.
+
+    A file is admitted when both the count and the byte budget allow for it.
+    A single file that is larger than the byte budget is still admitted, but only on its own.
+    """
+
+    def __init__(self, max_files: int, max_bytes: int) -> None:
+        self.max_files = max(1, max_files)
+        self.max_bytes = max_bytes
+        self.files = 0
+        self.bytes = 0
+        self.peak_files = 0
+        self.peak_bytes = 0
+        self.cond = asyncio.Condition()
+
+    def fits(self, size: int):
+        if self.files == 0:
+            return True
+        return self.files < self.max_files and self.bytes + size <= self.max_bytes
+
+    async def acquire(self, size: int):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.fits(size))
+            self.files += 1
+            self.bytes += size
+            self.peak_files = max(self.peak_files, self.files)
+            self.peak_bytes = max(self.peak_bytes, self.bytes)
+
+    async def release(self, size: int):
+        async with self.cond:
+            self.files -= 1
+            self.bytes -= size
+            self.cond.notify_all()
@@ -5,7 +5,7 @@ import pydantic
 
 class PromptConfig(pydantic.BaseModel):
     system: str
-    template: str | None
+    template: str | None = None
     batch: int
     history: int
     source_lang: str
@@ -14,18 +14,53 @@ class PromptConfig(pydantic.BaseModel):
     _db: dict[str, str]
     _sample_in: dict[str, str]
     _sample_out: dict[str, str]
+    # System prompts per mode. Built once, cleared when the db or samples change.
+    _system_prompts: dict[str, str] = pydantic.PrivateAttr(default_factory=dict)
 
     transform_japanese:bool = True
 
-    @property
-    def get_text_db(self):
-        db_text = "; ".join([f'"{k}": "{v}"' for k, v in self.db.items()])
+    # Modes where every chunk of a container is sent at once (no history between chunks).
+    parallel_modes: list[str] = ["item", "skill", "database"]
+    # Source lines from the neighbouring chunks given as context in parallel modes.
+    context_lines: int = 5
+
+    # Token budget for the lines in a chunk. When set, `batch` is only the max lines per chunk.
+    batch_tokens: int | None = None
+    # Model context length. Used to keep system prompt + history + chunk + completion within it.
+    context_length: int | None = None
+    # Expected completion tokens per source token.
+    completion_ratio: float = 1.3
+    # Tokenizer for estimates (tokenizer.json path or hub name, needs `tokenizers`).
+    tokenizer: str | None = None
+    # Heuristic when no tokenizer is set.
+    chars_per_token: float = 3.5
+    cjk_chars_per_token: float = 1.0
+
+    # Only give the db terms that occur in each chunk (with the chunk) instead of the whole db in the system prompt.
+    glossary_filter: bool = True
+
+    @staticmethod
+    def format_db(db: dict[str, str]):
+        db_text = "; ".join([f'"{k}": "{v}"' for k, v in db.items()])
         db_text = f"[{db_text}]"
         return db_text
 
+    @property
+    def get_text_db(self):
+        return self.format_db(self.db)
+
     def get_system_prompt(self, mode: str):
+        if mode not in self._system_prompts:
+            self._system_prompts[mode] = self.build_system_prompt(mode)
+        return self._system_prompts[mode]
+
+    def build_system_prompt(self, mode: str):
         return self.system.format(
-            db_data=self.get_text_db,
+            db_data=(
+                "(Relevant terms are given with each request as Common Terms.)"
+                if self.glossary_filter
+                else self.get_text_db
+            ),
             source_lang=self.source_lang,
             dest_lang=self.dest_lang,
             mode=self.modes[mode],
@@ -44,6 +79,7 @@ class PromptConfig(pydantic.BaseModel):
     @db.setter
     def db(self, value):
         self._db = value
+        self._system_prompts.clear()
 
     @property
     def samples(self):
@@ -52,6 +88,7 @@ class PromptConfig(pydantic.BaseModel):
     @samples.setter
     def samples(self, value):
         self._sample_in, self._sample_out = value
+        self._system_prompts.clear()
 
 
 class ApiConfig(pydantic.BaseModel):
@@ -59,10 +96,31 @@ class ApiConfig(pydantic.BaseModel):
     host: str = ""
     model: str
     concurrency: int = 2
+    # Adaptive (AIMD) concurrency. `concurrency` is the starting limit.
+    adaptive: bool = False
+    min_concurrency: int = 1
+    max_concurrency: int = 8
+    # Back off once latency per token is this many times the best seen.
+    latency_tolerance: float = 2.0
+    # Chat completions only (no prompts.template). How the json schema of each chunk is sent:
+    # "response_format" (OpenAI, vLLM, llama.cpp), "guided_json" (vLLM, Aphrodite),
+    # "json_schema" (tabbyAPI, llama.cpp) or "none" to only ask for a ```json block.
+    structured_output: str = "response_format"
+    # Seconds to open a connection, and to wait for the next bytes of a response (e.g. stream chunks).
+    connect_timeout: float = 10.0
+    read_timeout: float = 120.0
+    # Seconds an idle connection is kept open for the next request.
+    keepalive_expiry: float = 60.0
+    # Needs the `h2` package (pip install httpx[http2]).
+    http2: bool = False
     params: dict[str, Any]
 
 class MVMZMangling(pydantic.BaseModel):
     speaker_check_for_mv:bool = True
+    # Validate the whole map (tiles, move routes, etc.) instead of only the event command lists.
+    full_map_validation:bool = False
+    # Database entries (items, skills, actors, ...) per container. Containers are translated in parallel.
+    database_shard: int = 40
     
 
 class EngineConfig(pydantic.BaseModel):
@@ -70,16 +128,82 @@ class EngineConfig(pydantic.BaseModel):
     rpgmaker:MVMZMangling
 
 
+class CacheConfig(pydantic.BaseModel):
+    # On-disk translation memory. Keyed by source text, model, mode and system prompt.
+    enabled: bool = True
+    path: str = "translation_memory.sqlite3"
+    # Least recently used entries are evicted past this.
+    max_entries: int = 200_000
+
+
+class PipelineConfig(pydantic.BaseModel):
+    # Max parsed files held in memory at once. The next file is loaded while the previous ones translate.
+    max_files: int = 4
+    # Max total size of the source json (in MB) for the files held in memory.
+    max_mb: float = 256
+    # Processes for parsing, preparing and applying files. 0 runs them in a thread instead.
+    workers: int = 2
+    # Threads writing the output files.
+    writers: int = 4
+    # Write translated files without indentation, like the RPG Maker editor does.
+    compact_output: bool = False
+
+
+# Failures allowed per failure class before a chunk is given up on.
+RETRY_BUDGETS = {
+    # Connection errors, timeouts and 5xx/429 responses.
+    "network": 6,
+    # Server stopped sending mid-stream.
+    "dropped": 4,
+    # Other 4xx responses (e.g. prompt too long). Usually not worth retrying.
+    "rejected": 1,
+    # No json, undecodable json or a stream closed early.
+    "format": 6,
+    # Keys failing validation without any progress.
+    "validation": 4,
+}
+
+
+class RetryConfig(pydantic.BaseModel):
+    # Backoff for endpoint failures: random(0, min(max_delay, base_delay * 2 ** n)) seconds.
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    # Wall-clock limit (seconds) for a single chunk, retries included. Starts at its first request.
+    chunk_deadline: float = 600
+    # Classes missing here use RETRY_BUDGETS.
+    budgets: dict[str, int] = RETRY_BUDGETS
+
+
+class MetricsConfig(pydantic.BaseModel):
+    # Ask the server for token usage at the end of each stream (`stream_options.include_usage`).
+    # Tokens are estimated when the server does not send it.
+    stream_usage: bool = True
+    # Also write the metrics in Prometheus text format (outputs/rpgmaker_metrics.prom).
+    prometheus: bool = False
+    # Price per 1M tokens, for the cost estimate in the report.
+    prompt_price: float = 0.0
+    completion_price: float = 0.0
+
+
 class TomlConfig(pydantic.BaseModel):
     prompts: PromptConfig
     api: ApiConfig
     engine: EngineConfig
+    cache: CacheConfig = CacheConfig()
+    pipeline: PipelineConfig = PipelineConfig()
+    retry: RetryConfig = RetryConfig()
+    metrics: MetricsConfig = MetricsConfig()
 
 
 class TranslationContainer(pydantic.BaseModel):
     tl_type: str
     data: dict[str, str | list | dict[str, list[str]]]
     translated: dict[str, str | list | dict] = {}
+    # (file name, container index) the container was planned from. Used for metrics and the dead letter.
+    origin: tuple[str, int] | None = None
+    # Parser state the translations are applied back into (e.g. the decompiled event page).
+    # Kept in memory only.
+    source: Any = pydantic.Field(default=None, exclude=True, repr=False)
 
     @property
     def get_text_map(self):
@@ -88,7 +212,10 @@ class TranslationContainer(pydantic.BaseModel):
             return mappings
         transformed_keys = {k.upper():v for k,v in self.translated.items()}
         for k, v in self.data.items():
+            # Lines that failed to translate are left out.
+            if k.upper() not in transformed_keys:
+                continue
             if isinstance(v,list):
                 v = tuple(v)
-            mappings[v] = transformed_keys[k]
+            mappings[v] = transformed_keys[k.upper()]
         return mappings
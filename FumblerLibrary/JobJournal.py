@@ -0,0 +1,122 @@
+import hashlib
+import os
+import pathlib
+from typing import Any
+
+import orjson
+from loguru import logger
+
+
+class JobJournal:
+    """Append-only journal of validated chunks and finished files.
+
+    Every validated chunk response is written (and flushed) as soon as it arrives, one
+    translation per source line keyed by the line's content (mode and source). On resume, the
+    journal is replayed so that only the missing lines are sent again. Replay does not depend on
+    how lines were deduplicated between files or split into chunks, which can differ between runs.
+    """
+
+    def __init__(self, path: pathlib.Path, resume: bool = False) -> None:
+        self.path = path
+        # line hash -> translation
+        self.lines: dict[str, Any] = {}
+        self.files: dict[str, str] = {}
+        self.replayed = 0
+        if resume and path.exists():
+            self.load()
+        elif path.exists():
+            logger.info(f"Starting a fresh journal at {path}")
+            path.unlink()
+        self.fp = open(path, "ab")
+
+    def load(self):
+        entries = 0
+        # End of the last complete line.
+        complete = 0
+        with open(self.path, "rb") as fp:
+            for line in fp:
+                if line.endswith(b"\n"):
+                    complete += len(line)
+                try:
+                    entry = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    # Torn write from a crash. Everything before it is still good.
+                    logger.warning(f"Skipping broken journal line in {self.path}")
+                    continue
+                entries += 1
+                if entry["type"] == "lines":
+                    self.lines.update(entry["lines"])
+                elif entry["type"] == "file":
+                    self.files[entry["file"]] = entry["source"]
+        if self.path.stat().st_size > complete:
+            # Cut off a torn last line, or the next entry would be appended onto it.
+            with open(self.path, "r+b") as fp:
+                fp.truncate(complete)
+        logger.info(
+            f"Resuming from journal: {len(self.lines)} lines and {len(self.files)} files done ({entries} entries)."
+        )
+
+    @staticmethod
+    def hash_line(tl_type: str, value: Any) -> str:
+        return hashlib.blake2b(
+            orjson.dumps([tl_type, value]), digest_size=16
+        ).hexdigest()
+
+    @staticmethod
+    def hash_file(file: pathlib.Path) -> str:
+        return hashlib.sha256(file.read_bytes()).hexdigest()
+
+    def append(self, entry: dict):
+        self.fp.write(orjson.dumps(entry) + b"\n")
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+
+    def get_lines(
+        self, tl_type: str, raw_chunk: dict[str, Any]
+    ) -> tuple[dict[str, Any], dict[str, Any]]:
+        """Splits a chunk into journaled translations and lines that still need work.
+
+        Returns:
+            tuple[dict, dict]: (KEY -> journaled translation, key -> source)
+        """
+        found: dict[str, Any] = {}
+        missing: dict[str, Any] = {}
+        for k, v in raw_chunk.items():
+            line = self.hash_line(tl_type, v)
+            if line in self.lines:
+                found[k.upper()] = self.lines[line]
+            else:
+                missing[k] = v
+        self.replayed += len(found)
+        return found, missing
+
+    def record_lines(
+        self, tl_type: str, raw_chunk: dict[str, Any], translated: dict[str, Any]
+    ):
+        """Records the translations of a chunk. Lines without a translation are left out."""
+        lines = {
+            self.hash_line(tl_type, v): translated[k.upper()]
+            for k, v in raw_chunk.items()
+            if k.upper() in translated
+        }
+        if not lines:
+            return
+        self.lines.update(lines)
+        self.append({"type": "lines", "lines": lines})
+
+    def is_file_done(self, file: pathlib.Path) -> bool:
+        return self.files.get(file.name) == self.hash_file(file)
+
+    def record_file(self, file: pathlib.Path):
+        source = self.hash_file(file)
+        self.files[file.name] = source
+        self.append({"type": "file", "file": file.name, "source": source})
+
+    def close(self):
+        if self.fp.closed:
+            return
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+        self.fp.close()
+        if self.replayed:
+            logger.info(f"Journal: replayed {self.replayed} lines.")
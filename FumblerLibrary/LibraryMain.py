@@ -2,80 +2,180 @@ import asyncio
 import pathlib
 
 from loguru import logger
-import orjson
 
+from FumblerLibrary.FileBudget import FileBudget
 from FumblerLibrary.FumblerModels import TomlConfig
+from FumblerLibrary.JobJournal import JobJournal
+from FumblerLibrary.OutputWriter import OutputWriter
+from FumblerLibrary.ProjectManifest import ProjectManifest
+from FumblerLibrary.StageProfiler import stages
+from FumblerLibrary.StageWorkers import StageWorkers
+from FumblerLibrary.Translators.RetryPolicy import DeadLetter
+from FumblerLibrary.TranslationPlanner import TranslationPlanner
 
 
 async def process_rpgmaker(
-    inputs: list[pathlib.Path], output_folder: pathlib.Path, config: TomlConfig
+    inputs: list[pathlib.Path],
+    output_folder: pathlib.Path,
+    config: TomlConfig,
+    resume: bool = False,
+    profile: bool = False,
+    incremental: bool = False,
+):
+    stages.reset(profile=profile)
+    journal = JobJournal(output_folder / "rpgmaker_journal.jsonl", resume=resume)
+    dead_letter = DeadLetter(output_folder / "rpgmaker_dead_letter.jsonl")
+    manifest = ProjectManifest(output_folder / "rpgmaker_manifest.json")
+    try:
+        await _process_rpgmaker(
+            inputs,
+            output_folder,
+            config,
+            journal,
+            dead_letter,
+            manifest,
+            incremental,
+        )
+    except asyncio.CancelledError:
+        logger.warning(
+            "Interrupted. Finished chunks are kept in the journal, run with --resume to continue."
+        )
+        raise
+    finally:
+        journal.close()
+        dead_letter.close()
+        manifest.save()
+        stages.summary()
+        if profile:
+            stages.dump_profiles(output_folder / "profile")
+
+
+async def _process_rpgmaker(
+    inputs: list[pathlib.Path],
+    output_folder: pathlib.Path,
+    config: TomlConfig,
+    journal: JobJournal,
+    dead_letter: DeadLetter,
+    manifest: ProjectManifest,
+    incremental: bool,
 ):
     from .Parsers.RPGMVMZ.GameParser import MVMZParser
+    from .Translators.OpenAICompatible.ChatTranslator import OAIChatTranslator
     from .Translators.OpenAICompatible.Translator import OAICompatTranslator
 
-    parser = MVMZParser(inputs, config)
-    if len(parser.parsed) == 0:
-        logger.error("No MV/MZ files detected.")
+    pending = [file for file in inputs if not journal.is_file_done(file)]
+    if len(pending) != len(inputs):
+        logger.info(f"Skipping: {len(inputs) - len(pending)} files already done.")
+    if incremental:
+        changed = [
+            file for file in pending if not manifest.is_unchanged(file, output_folder)
+        ]
+        if len(changed) != len(pending):
+            logger.info(
+                f"Incremental: skipping {len(pending) - len(changed)} unchanged files."
+            )
+        pending = changed
+    if not pending:
+        logger.info("Nothing to translate.")
         return
+    # Without a prompt template the server's chat template is used instead.
+    translator_cls = OAICompatTranslator if config.prompts.template else OAIChatTranslator
+    translator = translator_cls(config, journal=journal, dead_letter=dead_letter)
+    stage_workers = StageWorkers(
+        MVMZParser, config, config.pipeline.workers, profile=stages.profile
+    )
+    writer = OutputWriter(config.pipeline.writers)
+    logger.info(f"Translating: {len(pending)} files.")
 
-    translator = OAICompatTranslator(config)
-    logger.info(f"Translating: {len(parser.parsed)} files.")
-
-    concurrent = asyncio.Semaphore(config.api.concurrency)
+    planner = TranslationPlanner()
+    budget = FileBudget(
+        config.pipeline.max_files, int(config.pipeline.max_mb * 1024 * 1024)
+    )
 
-    # Gross code wrapped into a worker
-    async def patch_worker(origFile: pathlib.Path, parsed_data):
-        async with concurrent:
-            # Prepare containers for file and
-            if parsed_data is None:
-                return
-            translation_containers = parser.prepare_tl_containers(parsed_data)
-            if not translation_containers:
-                return
-            logger.debug(translation_containers)
-            logger.info(
-                f"Translating: {len([i for i in translation_containers if i])} containers for {origFile.name}"
-            )
-            translation_containers = await translator.translate_containers(
-                translation_containers
+    async def patch_worker(origFile: pathlib.Path, state, translation_containers):
+        output_file = output_folder / origFile.name
+        output_dump_file = (
+            output_folder / origFile.with_stem(origFile.stem + "_dump").name
+        )
+        if incremental:
+            # Only new or changed lines are planned, the rest comes from the last run.
+            source_containers, reused = manifest.split(
+                origFile, translation_containers, output_dump_file
             )
-            logger.debug(translation_containers)
-            logger.info(f"Applying: {len([i for i in translation_containers if i])}")
+        else:
+            source_containers, reused = translation_containers, None
+        work_containers = planner.claim(origFile, source_containers)
+        # Includes waiting on lines claimed by other files.
+        with stages.span("translate", origFile.name, cpu=False):
+            try:
+                work_containers = await translator.translate_containers(
+                    work_containers
+                )
+            finally:
+                # Never leave other files waiting on lines from this one.
+                planner.resolve(work_containers)
+            await planner.fan_out(source_containers)
+        if reused is not None:
+            for container, source, found in zip(
+                translation_containers, source_containers, reused
+            ):
+                if container:
+                    container.translated = {
+                        **found,
+                        **(source.translated if source else {}),
+                    }
+        logger.debug(translation_containers)
+        logger.info(
+            f"Applying: {len([i for i in translation_containers if i])} for {origFile.name}"
+        )
 
-            parsed_data = parser.apply_tl_containers(
-                parsed_data, translation_containers
-            )
+        output, mapping = await stage_workers.apply(
+            origFile, state, translation_containers
+        )
 
-            output_file = output_folder / origFile.name
-            output_dump_file = (
-                output_folder / origFile.with_stem(origFile.stem + "_dump").name
+        with stages.span("write", origFile.name, cpu=False):
+            await asyncio.gather(
+                writer.write(output_file, output),
+                writer.write(output_dump_file, mapping),
             )
+        journal.record_file(origFile)
+        manifest.record(origFile, translation_containers)
 
-            if isinstance(parsed_data, list):
-                parsed_data = [
-                    i.model_dump(mode="json") if i else i for i in parsed_data
-                ]
-                (output_file).write_bytes(
-                    orjson.dumps(parsed_data, option=orjson.OPT_INDENT_2)
-                )
-            else:
-                (output_file).write_bytes(
-                    orjson.dumps(
-                        parsed_data.model_dump(mode="json"),
-                        option=orjson.OPT_INDENT_2,
-                    )
-                )
-            output_dump_file.write_bytes(
-                orjson.dumps(
-                    parser.get_full_mapping(translation_containers, json=True),
-                    option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
-                )
+    async def file_worker(origFile: pathlib.Path, size: int) -> bool:
+        try:
+            prepared = await stage_workers.prepare(origFile)
+            if prepared is None:
+                return False
+            state, containers = prepared
+            del prepared
+            logger.info(
+                f"Prepared: {len([i for i in containers if i])} containers for {origFile.name}"
             )
-            origFile.unlink()
+            await patch_worker(origFile, state, containers)
+            return True
+        finally:
+            # Release the parsed file as soon as the output has been written.
+            await budget.release(size)
 
-    await asyncio.gather(
-        *[
-            patch_worker(parsed_file, parsed_databundle)
-            for parsed_file, parsed_databundle in parser.parsed
-        ]
+    # Files are prepared (in the stage workers) while earlier ones are translating.
+    workers: list[asyncio.Task] = []
+    try:
+        for origFile in pending:
+            origFile = origFile.resolve()
+            size = origFile.stat().st_size
+            await budget.acquire(size)
+            workers.append(asyncio.create_task(file_worker(origFile, size)))
+        if not any(await asyncio.gather(*workers)):
+            logger.error("No MV/MZ files detected.")
+            return
+    finally:
+        for worker in workers:
+            worker.cancel()
+        stage_workers.close()
+        writer.close()
+        await translator.close()
+        translator.metrics.write(output_folder)
+    planner.summary()
+    logger.info(
+        f"Peak parsed files in memory: {budget.peak_files} ({budget.peak_bytes / 1024 / 1024:.1f} MB of json)"
     )
@@ -0,0 +1,105 @@
+import asyncio
+import concurrent.futures
+import os
+import pathlib
+from typing import Any
+
+import orjson
+from loguru import logger
+
+
+def dumps_output(data: Any, compact: bool = False) -> bytes:
+    """Serializes a translated data file.
+
+    Args:
+        data (Any): json-able data.
+        compact (bool): Write like the RPG Maker editor does: no indentation, with the entries of
+            top level lists (database files) and map events on their own lines.
+
+    Returns:
+        bytes: The json.
+    """
+    if not compact:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+
+    def lines(items: list) -> bytes:
+        return b"[\n" + b",\n".join(orjson.dumps(item) for item in items) + b"\n]"
+
+    if isinstance(data, list):
+        return lines(data)
+    if isinstance(data, dict) and isinstance(data.get("events"), list):
+        return (
+            b"{\n"
+            + b",".join(
+                b"\n" + orjson.dumps(key) + b":" + lines(value)
+                if key == "events"
+                else orjson.dumps(key) + b":" + orjson.dumps(value)
+                for key, value in data.items()
+            )
+            + b"\n}"
+        )
+    return orjson.dumps(data)
+
+
+class OutputWriter:
+    """Writes output files from a thread pool.
+
+    Files are written to a temporary file next to the target and renamed over it, so a crash
+    never leaves a half written file behind. Files whose content is already in place are skipped.
+    """
+
+    def __init__(self, workers: int = 4) -> None:
+        self.pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="writer"
+        )
+        self.written = 0
+        self.skipped = 0
+        self.bytes = 0
+
+    @staticmethod
+    def unchanged(path: pathlib.Path, data: bytes) -> bool:
+        try:
+            if path.stat().st_size != len(data):
+                return False
+            return path.read_bytes() == data
+        except FileNotFoundError:
+            return False
+
+    def write_sync(self, path: pathlib.Path, data: bytes) -> bool:
+        """Writes a file atomically.
+
+        Returns:
+            bool: False if the file already had the same content.
+        """
+        if self.unchanged(path, data):
+            return False
+        temp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(temp, "wb") as fp:
+                fp.write(data)
+                fp.flush()
+                os.fsync(fp.fileno())
+            os.replace(temp, path)
+        finally:
+            temp.unlink(missing_ok=True)
+        return True
+
+    async def write(self, path: pathlib.Path, data: bytes) -> bool:
+        written = await asyncio.get_running_loop().run_in_executor(
+            self.pool, self.write_sync, path, data
+        )
+        if written:
+            self.written += 1
+            self.bytes += len(data)
+        else:
+            self.skipped += 1
+            logger.debug(f"Unchanged: {path}")
+        return written
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        if self.written or self.skipped:
+            logger.info(
+                f"Wrote {self.written} files ({self.bytes / 1024 / 1024:.1f} MB), "
+                f"skipped {self.skipped} unchanged."
+            )
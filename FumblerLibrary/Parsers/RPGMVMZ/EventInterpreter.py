@@ -142,10 +142,8 @@ class EventInterpreter:
             value["text"] = " ".join(value["text"])
         name = value["name"]
         return EventText(
-            code=-1,
             indent=base_event.indent,
             is_predicted=is_predicted,
-            parameters=[],
             text=value["text"],
             faceData=(faceName, faceIdx),
             background=bgmIdx,
@@ -156,10 +154,7 @@ class EventInterpreter:
     def eventCommentParser(self):
         event_data = self.events[self.ptr]
         self.ptr += 1
-        if EvtPluginKMSActiveMessage.wrap(event_data):
-            return EvtPluginKMSActiveMessage.wrap(event_data)
-        else:
-            return event_data
+        return EvtPluginKMSActiveMessage.wrap(event_data) or event_data
 
     def run(self) -> Generator[EVENTS_TYPES | None, None, None]:
         self.ptr = 0
@@ -187,7 +182,7 @@ class EventInterpreter:
                 for subevent in event.as_evtbase:
                     yield subevent
             elif isinstance(event, EventWrapped):
-                yield super(EventBase, event)  # type: ignore
+                yield EventBase(event.code, event.indent, event.parameters)
             elif isinstance(event, EventBase):
                 if event.code < 0:
                     raise Exception(
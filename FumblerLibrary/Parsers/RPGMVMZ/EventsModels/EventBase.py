@@ -1,7 +1,8 @@
 import enum
 from typing import Any, Generic, List, TypeVar
 
-from pydantic import BaseModel
+from pydantic import GetCoreSchemaHandler
+from pydantic_core import core_schema
 
 T = TypeVar("T")
 
@@ -69,13 +70,56 @@ class EventTypes(enum.IntEnum):
     EVENT_COMMENT_2 = 108
 
 
-class EventBase(BaseModel):
-    code: EventTypes | int
-    indent: int
-    parameters: List[Any]
+class EventBase:
+    """A single event command.
+
+    Event lists run into the hundreds of thousands of commands, so commands are plain slotted
+    objects rather than models. Pydantic still validates them where a file is loaded
+    (`List[EventBase]` fields) and dumps them back as `{code, indent, parameters}`.
+    """
+
+    __slots__ = ("code", "indent", "parameters")
+
+    def __init__(self, code: EventTypes | int, indent: int, parameters: List[Any]) -> None:
+        self.code = code
+        self.indent = indent
+        self.parameters = parameters
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> "EventBase":
+        return cls(data["code"], data["indent"], data["parameters"])
+
+    def to_json(self) -> dict[str, Any]:
+        return {"code": self.code, "indent": self.indent, "parameters": self.parameters}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(code={self.code}, indent={self.indent}, parameters={self.parameters})"
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, source: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        command = core_schema.typed_dict_schema(
+            {
+                "code": core_schema.typed_dict_field(core_schema.int_schema()),
+                "indent": core_schema.typed_dict_field(core_schema.int_schema()),
+                "parameters": core_schema.typed_dict_field(core_schema.list_schema()),
+            }
+        )
+        return core_schema.union_schema(
+            [
+                core_schema.is_instance_schema(cls),
+                core_schema.no_info_after_validator_function(cls.from_json, command),
+            ],
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                cls.to_json
+            ),
+        )
 
 
 class EventWrapped(Generic[T]):
+    __slots__ = ()
+
     @classmethod
     def wrap(cls, event: EventBase) -> "T | None":
         raise NotImplementedError()
@@ -8,16 +8,30 @@ from .EventBase import EventBase, EventWrapped
 class EventText(EventBase):
     # EventText extends from EventBase. 
     # This combines multiple show text codes into 1 bigger block
-    
-    # (faceName, faceIndex)
-    # ...faceIndex is supposed to be a string but
-    # I suppose it gets cast to an integer?
-    faceData: tuple[str, int | str]
-    background: int
-    position: int
-    text: str
-    name: str | None
-    is_predicted:bool
+
+    __slots__ = ("faceData", "background", "position", "text", "name", "is_predicted")
+
+    def __init__(
+        self,
+        indent: int,
+        faceData: tuple[str, int | str],
+        background: int,
+        position: int,
+        text: str,
+        name: str | None,
+        is_predicted: bool,
+    ) -> None:
+        # Not a real command, it is expanded back by as_evtbase.
+        super().__init__(-1, indent, [])
+        # (faceName, faceIndex)
+        # ...faceIndex is supposed to be a string but
+        # I suppose it gets cast to an integer?
+        self.faceData = faceData
+        self.background = background
+        self.position = position
+        self.text = text
+        self.name = name
+        self.is_predicted = is_predicted
 
     @property
     def as_evtbase(self) -> Generator[EventBase, None, None]:
@@ -48,9 +62,11 @@ class EventText(EventBase):
 
 class EventChoice(EventBase, EventWrapped):
     # Does event choices.
+    __slots__ = ()
+
     @classmethod
     def wrap(cls, event: EventBase) -> "EventChoice":
-        return cls(code=event.code, indent=event.indent, parameters=event.parameters)
+        return cls(event.code, event.indent, event.parameters)
 
     @property
     def choices(self) -> tuple:
@@ -9,12 +9,12 @@ EvtActiveMessage_rgx = re.compile(
 
 
 class EvtPluginKMSActiveMessage(EventBase, EventWrapped):
+    __slots__ = ()
+
     @classmethod
     def wrap(cls, event: EventBase) -> "EvtPluginKMSActiveMessage | None":
         return (
-            EvtPluginKMSActiveMessage(
-                code=event.code, indent=event.indent, parameters=event.parameters
-            )
+            cls(event.code, event.indent, event.parameters)
             if event.parameters
             and isinstance(event.parameters[0], str)
             and EvtActiveMessage_rgx.search(event.parameters[0])
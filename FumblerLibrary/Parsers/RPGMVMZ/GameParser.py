@@ -1,11 +1,13 @@
+import collections
 import pathlib
-from typing import Any, List
+from typing import Any
 
 import orjson
 import tqdm
 from loguru import logger
 
 from FumblerLibrary.FumblerModels import TomlConfig, TranslationContainer
+from FumblerLibrary.StageProfiler import stages
 
 from .EventInterpreter import EVENTS_TYPES, EventInterpreter
 from .EventsModels.EventCommon import EventChoice, EventText
@@ -17,82 +19,131 @@ from .RPGMVZModels import (
     Enemy,
     Item,
     MapFile,
+    RawMapFile,
     Skill,
+    Weapon,
 )
 
+# Database files: model -> (mode, key prefix, translated fields).
+# Each entry is packed as one line holding a list of its fields.
+DATABASE_FIELDS: dict[type, tuple[str, str, tuple[str, ...]]] = {
+    Actor: ("database", "AC", ("name", "nickname", "profile")),
+    Armor: ("item", "AR", ("name", "description")),
+    Classes: ("database", "CL", ("name",)),
+    Enemy: ("database", "EN", ("name",)),
+    Item: ("item", "IT", ("name", "description")),
+    Skill: ("skill", "SK", ("name", "description", "message1", "message2")),
+    Weapon: ("item", "WP", ("name", "description")),
+}
+
+
+class EventPage:
+    """Decompiled events of a page (or common event), kept from prepare to apply."""
+
+    __slots__ = ("owner", "events")
+
+    def __init__(self, owner: Any, events: list[EVENTS_TYPES]) -> None:
+        # Anything with a `list` of commands. Setting it writes the page back.
+        self.owner = owner
+        self.events = events
+
 
 class MVMZParser:
     def __init__(self, files: list[pathlib.Path], config: TomlConfig) -> None:
+        # Files are loaded lazily with load_file. Call parse_files to load everything at once.
         self.files = files
         self.parsed: list[tuple[pathlib.Path, Any]] = []
-        self.parse_files()
         self.config = config
 
     def parse_files(self):
         for file in self.files:
-            file = file.resolve()
-            logger.info(f"Loading {file} with RPGM Loader...")
-            try:
-                json_data = orjson.loads(file.read_bytes())
-            except orjson.JSONDecodeError:
-                logger.warning(f"Decode error for: {file}")
-                continue
-            if isinstance(json_data, list) and len(json_data) >= 2:
-                dict_item: dict = json_data[1]
-                if "characterName" in dict_item:
-                    logger.info(f"Detected {file} as ActorList.")
-                    self.parsed.append(
-                        (file, [Actor(**data) if data else None for data in json_data])
-                    )
-                elif "atypeId" in dict_item and "etypeId" in dict_item:
-                    logger.info(f"Detected {file} as ArmorList.")
-                    self.parsed.append(
-                        (file, [Armor(**data) if data else None for data in json_data])
-                    )
-                elif "expParams" in dict_item and "learnings" in dict_item:
-                    logger.info(f"Detected {file} as ClassesList.")
-                    self.parsed.append(
-                        (
-                            file,
-                            [Classes(**data) if data else None for data in json_data],
-                        )
-                    )
-                elif "switchId" in dict_item and "trigger" in dict_item:
-                    logger.info(f"Detected {file} as CommonEventsList.")
-                    self.parsed.append(
-                        (
-                            file,
-                            [
-                                CommonEvent(**data) if data else None
-                                for data in json_data
-                            ],
-                        )
-                    )
-                elif "battlerHue" in dict_item:
-                    logger.info(f"Detected {file} as EnemyList.")
-                    self.parsed.append(
-                        (file, [Enemy(**data) if data else None for data in json_data])
-                    )
-                elif "consumable" in dict_item:
-                    logger.info(f"Detected {file} as ItemsList")
-                    self.parsed.append(
-                        (file, [Item(**data) if data else None for data in json_data])
-                    )
-                elif "requiredWtypeId1" in dict_item:
-                    logger.info(f"Detected {file} as SkillsList")
-                    self.parsed.append(
-                        (file, [Skill(**data) if data else None for data in json_data])
-                    )
-            elif isinstance(json_data, dict):
-                if "autoplayBgm" in json_data:
-                    logger.info(f"Detected MapFile: {file}")
-                    self.parsed.append((file, MapFile(**json_data)))
+            parsed = self.load_file(file)
+            if parsed is not None:
+                self.parsed.append((file.resolve(), parsed))
+
+    def load_file(self, file: pathlib.Path) -> Any | None:
+        """Loads and detects a single RPG Maker data file.
+
+        Args:
+            file (pathlib.Path): The json file to load.
+
+        Returns:
+            Any | None: The parsed models or None if the file is not supported.
+        """
+        file = file.resolve()
+        logger.info(f"Loading {file} with RPGM Loader...")
+        try:
+            json_data = orjson.loads(file.read_bytes())
+        except orjson.JSONDecodeError:
+            logger.warning(f"Decode error for: {file}")
+            return None
+        if isinstance(json_data, list) and len(json_data) >= 2:
+            dict_item: dict = json_data[1]
+            if "characterName" in dict_item:
+                logger.info(f"Detected {file} as ActorList.")
+                return [Actor(**data) if data else None for data in json_data]
+            elif "atypeId" in dict_item and "etypeId" in dict_item:
+                logger.info(f"Detected {file} as ArmorList.")
+                return [Armor(**data) if data else None for data in json_data]
+            elif "wtypeId" in dict_item and "etypeId" in dict_item:
+                logger.info(f"Detected {file} as WeaponList.")
+                return [Weapon(**data) if data else None for data in json_data]
+            elif "expParams" in dict_item and "learnings" in dict_item:
+                logger.info(f"Detected {file} as ClassesList.")
+                return [Classes(**data) if data else None for data in json_data]
+            elif "switchId" in dict_item and "trigger" in dict_item:
+                logger.info(f"Detected {file} as CommonEventsList.")
+                return [CommonEvent(**data) if data else None for data in json_data]
+            elif "battlerHue" in dict_item:
+                logger.info(f"Detected {file} as EnemyList.")
+                return [Enemy(**data) if data else None for data in json_data]
+            elif "consumable" in dict_item:
+                logger.info(f"Detected {file} as ItemsList")
+                return [Item(**data) if data else None for data in json_data]
+            elif "requiredWtypeId1" in dict_item:
+                logger.info(f"Detected {file} as SkillsList")
+                return [Skill(**data) if data else None for data in json_data]
+        elif isinstance(json_data, dict):
+            if "autoplayBgm" in json_data:
+                logger.info(f"Detected MapFile: {file}")
+                if self.config.engine.rpgmaker.full_map_validation:
+                    return MapFile(**json_data)
+                return RawMapFile(json_data)
+        return None
+
+    @staticmethod
+    def dump_data(data: Any) -> Any:
+        """Converts loaded data back into json-able python objects.
+
+        Args:
+            data (Any): Data from load_file.
 
-    def _interp_event_list(self, events: List[EVENTS_TYPES]) -> dict[str, Any]:
+        Returns:
+            Any: json-able objects.
+        """
+        if isinstance(data, RawMapFile):
+            # Pages were already written back in place.
+            return data.raw
+        elif isinstance(data, list):
+            return [i.model_dump(mode="json") if i else i for i in data]
+        return data.model_dump(mode="json")
+
+    def _interp_event_list(self, owner: Any) -> TranslationContainer | None:
+        """Decompiles an event list into a container.
+
+        The decompiled events are kept as the container's source. `L_xx` keys are
+        the event's position within them.
+
+        Args:
+            owner (Any): Page or common event holding the `list` of commands.
+
+        Returns:
+            TranslationContainer | None: The container or None if there is nothing to translate.
+        """
         parsed_event_data: dict[str, Any] = {}
-        for eventId, event in enumerate(
-            EventInterpreter.decompile(events, self.config)
-        ):
+        with stages.span("decompile"):
+            interpEvents = list(EventInterpreter.decompile(owner.list, self.config))
+        for eventId, event in enumerate(interpEvents):
             if isinstance(event, EventText):
                 if event.name:
                     text = [event.name, event.text]
@@ -101,7 +152,107 @@ class MVMZParser:
                 parsed_event_data[f"L_{str(eventId).zfill(2)}"] = text
             elif isinstance(event, EventChoice):
                 parsed_event_data[f"L_{str(eventId).zfill(2)}"] = event.choices
-        return parsed_event_data
+        if not parsed_event_data:
+            return None
+        return TranslationContainer(
+            tl_type="event",
+            data=parsed_event_data,
+            source=EventPage(owner, interpEvents),
+        )
+
+    def _apply_event_page(
+        self, container: TranslationContainer, stats: collections.Counter
+    ) -> bool:
+        """Writes translations back into a container's decompiled events.
+
+        Returns:
+            bool: True if anything changed (and the page was recompiled).
+        """
+        page: EventPage = container.source
+        changed = False
+        for key, tl_data in container.translated.items():
+            eventData = page.events[int(key.split("_", 1)[1])]
+            if isinstance(eventData, EventText):
+                if eventData.name:
+                    if not isinstance(tl_data, list) or len(tl_data) != 2:
+                        logger.warning(f"Invalid name/text pair for {key}: {tl_data}")
+                        continue
+                    eventData.name, eventData.text = tl_data
+                elif isinstance(tl_data, str):
+                    eventData.text = tl_data
+                else:
+                    logger.warning(f"Invalid text for {key}: {tl_data}")
+                    continue
+                stats["Text"] += 1
+            elif isinstance(eventData, EventChoice):
+                # Choice branches refer to choices by index so the count has to match.
+                if not isinstance(tl_data, list) or len(tl_data) != len(
+                    eventData.choices
+                ):
+                    logger.warning(f"Invalid choices for {key}: {tl_data}")
+                    continue
+                eventData.choices = list(tl_data)
+                stats["Choices"] += 1
+            else:
+                stats["?"] += 1
+                continue
+            changed = True
+        if changed:
+            with stages.span("compile"):
+                page.owner.list = list(EventInterpreter.compile(page.events))
+        return changed
+
+    def _prepare_database(
+        self, data: list, tl_type: str, prefix: str, fields: tuple[str, ...]
+    ) -> list[TranslationContainer | None]:
+        """Packs a database file into shards of `database_shard` entries.
+
+        Shards are independent containers so they are translated in parallel.
+        Keys are the entry's index (e.g. `IT_0012`), values the entry's fields.
+        """
+        if tl_type not in self.config.prompts.modes:
+            logger.warning(
+                f"Skipping {type(data[1]).__name__} entries: no `{tl_type}` mode in [prompts.modes]."
+            )
+            return []
+        shard_size = max(1, self.config.engine.rpgmaker.database_shard)
+        containers: list[TranslationContainer | None] = []
+        shard: dict[str, Any] = {}
+        for entryidx, entry in enumerate(data):
+            if not entry:
+                continue
+            entry_data = [getattr(entry, field) for field in fields]
+            if not any(entry_data):
+                continue
+            shard[f"{prefix}_{str(entryidx).zfill(4)}"] = entry_data
+            if len(shard) >= shard_size:
+                containers.append(TranslationContainer(tl_type=tl_type, data=shard))
+                shard = {}
+        if shard:
+            containers.append(TranslationContainer(tl_type=tl_type, data=shard))
+        return containers
+
+    def _apply_database(
+        self,
+        data: list,
+        translations: list[TranslationContainer | None],
+        fields: tuple[str, ...],
+    ):
+        applied = 0
+        for container in translations:
+            if not container:
+                continue
+            for key, tl_data in container.translated.items():
+                entry = data[int(key.split("_", 1)[1])]
+                if not isinstance(tl_data, list) or len(tl_data) != len(fields):
+                    logger.warning(f"Invalid fields for {key}: {tl_data}")
+                    continue
+                for field, value in zip(fields, tl_data):
+                    # Fields that were empty stay empty.
+                    if getattr(entry, field) and isinstance(value, str):
+                        setattr(entry, field, value)
+                applied += 1
+        logger.info(f"applied data: {applied} {type(data[1]).__name__} entries")
 
     @staticmethod
     def get_full_mapping(
@@ -123,139 +274,28 @@ class MVMZParser:
         data: Any,
         translations: list[TranslationContainer | None],
     ):
-        # Create a orig -> translated mappings
-
-        if isinstance(data, MapFile):
-            stats = {}
-            text_maps = self.get_full_mapping(translations)
-            for mapIdx, mapEvent in tqdm.tqdm(
-                enumerate(data.events), desc="Map Events Processed"
-            ):
-                if not mapEvent:
-                    continue
-                # logger.debug(translations[mapIdx])
-                for pageKey, pageData in enumerate(mapEvent.pages):
-                    interpEvents = list(
-                        EventInterpreter.decompile(pageData.list, self.config)
-                    )
-                    do_repack = False
-                    for eventData in interpEvents:
-                        # Apply Text
-                        if (
-                            isinstance(eventData, EventText)
-                            and eventData.text in text_maps
-                        ):
-                            eventData.text = text_maps[eventData.text]
-                            do_repack = True
-                            stats["Text"] = stats.setdefault("Text", 0) + 1
-                        # Text V2
-                        elif (
-                            isinstance(eventData, EventText)
-                            and tuple([eventData.name, eventData.text]) in text_maps
-                        ):
-                            key = tuple([eventData.name, eventData.text])
-                            tl_data = text_maps[key]
-                            eventData.name = tl_data[0]
-                            eventData.text = tl_data[1]
-                            do_repack = True
-                            stats["Text"] = stats.setdefault("Text", 0) + 1
-                        # Apply Choices
-                        elif (
-                            isinstance(eventData, EventChoice)
-                            and tuple(eventData.choices) in text_maps
-                        ):
-                            eventData.choices = list(
-                                text_maps[tuple(eventData.choices)]
-                            )
-                            do_repack = True
-                            stats["Choices"] = stats.setdefault("Choices", 0) + 1
-                        else:
-                            stats["?"] = stats.setdefault("?", 0) + 1
-                        # TODO: Expand more here
-                    if do_repack:
-                        pageData.list = list(EventInterpreter.compile(interpEvents))
-                        mapEvent.pages[pageKey] = pageData
-                        data.events[mapIdx] = mapEvent
-            logger.info(f"applied data: {stats}")
+        if isinstance(data, (MapFile, RawMapFile)) or (
+            isinstance(data, list)
+            and len(data) >= 2
+            and isinstance(data[1], CommonEvent)
+        ):
+            # Pages and common events are edited in place through the kept events.
+            stats: collections.Counter = collections.Counter()
+            repacked = 0
+            for container in translations:
+                if container and container.translated and container.source is not None:
+                    repacked += self._apply_event_page(container, stats)
+            logger.info(f"applied data: {dict(stats)}, recompiled {repacked} lists")
         elif isinstance(data, list) and len(data) >= 2:
-            firstData = data[1]
-            if isinstance(firstData, CommonEvent):
-                text_maps = self.get_full_mapping(translations)
-                for commonIdx, commonEvent in enumerate(data):
-                    if not commonEvent:
-                        continue
-                    interpEvents = list(
-                        EventInterpreter.decompile(commonEvent.list, self.config)
-                    )
-                    do_repack = False
-                    for eventData in interpEvents:
-                        if (
-                            isinstance(eventData, EventText)
-                            and eventData.text in text_maps
-                        ):
-                            logger.info("Applying Text")
-                            eventData.text = text_maps[eventData.text]
-                            do_repack = True
-                        elif (
-                            isinstance(eventData, EventText)
-                            and tuple([eventData.name, eventData.text]) in text_maps
-                        ):
-                            logger.info("Applying Text Pair")
-                            key = tuple([eventData.name, eventData.text])
-                            tl_data = text_maps[key]
-                            eventData.name = tl_data[0]
-                            eventData.text = tl_data[1]
-                            do_repack = True
-                        # Apply Choices
-                        elif (
-                            isinstance(eventData, EventChoice)
-                            and tuple(eventData.choices) in text_maps
-                        ):
-                            logger.info("Applying Choice")
-                            eventData.choices = list(
-                                text_maps[tuple(eventData.choices)]
-                            )
-                            do_repack = True
-                    if do_repack:
-                        commonEvent.list = list(EventInterpreter.compile(interpEvents))
-                        data[commonIdx] = commonEvent
-            elif isinstance(firstData, Item) and translations[0] is not None:
-                tldata = translations[0].translated
-                for itemidx, item in tqdm.tqdm(enumerate(data), desc="Items Processed"):
-                    if not item or not itemidx not in tldata:
-                        continue
-                    do_proc = any([item.name, item.description, item.note])
-                    if not do_proc:
-                        continue
-                    itemtl = translations[0].translated[f"IT_{str(itemidx).zfill(4)}"]
-                    if len(itemtl) == 1:
-                        logger.warning(f"Potentially invalid itemtl: {itemtl}")
-                    if len(itemtl) == 2:
-                        if item.name:
-                            item.name = itemtl[0]
-                        if item.description:
-                            item.description = itemtl[1]
-                        if item.note and item.description:
-                            logger.warning(
-                                "Detected collision of note and description."
-                            )
-                        else:
-                            item.note = itemtl[1]
-                            # ????
-                    elif len(itemtl) == 3:
-                        # For items it's as 1 translation container.
-                        item.name, item.description, item.note = translations[
-                            0
-                        ].translated[f"IT_{str(itemidx).zfill(4)}"]
-                    else:
-                        logger.warning(f"{itemtl} has invalid count of items.")
-                    data[itemidx] = item
+            fields = DATABASE_FIELDS.get(type(data[1]))
+            if fields:
+                self._apply_database(data, translations, fields[2])
         return data
 
     def prepare_tl_containers(
         self, data: Any
     ) -> list[TranslationContainer | None] | None:
-        if isinstance(data, MapFile):
+        if isinstance(data, (MapFile, RawMapFile)):
             # Map files
             map_events_list: list[TranslationContainer | None] = []
             for _, mapEvent in tqdm.tqdm(
@@ -263,16 +303,8 @@ class MVMZParser:
             ):
                 # Flatten page data to just a list of events for the map.
                 if mapEvent:
-                    for pageidx, page in enumerate(mapEvent.pages):
-                        pageData = self._interp_event_list(page.list)
-                        if pageData:
-                            map_events_list.append(
-                                TranslationContainer(tl_type="event", data=pageData)
-                            )
-                        else:
-                            map_events_list.append(None)
-                    else:
-                        map_events_list.append(None)
+                    for page in mapEvent.pages:
+                        map_events_list.append(self._interp_event_list(page))
                 else:
                     map_events_list.append(None)
             return map_events_list
@@ -289,21 +321,7 @@ class MVMZParser:
                     if not commEvt:
                         list_containers.append(None)
                         continue
-                    pageData = self._interp_event_list(commEvt.list)
-                    if pageData:
-                        list_containers.append(
-                            TranslationContainer(tl_type="event", data=pageData)
-                        )
-                    else:
-                        list_containers.append(None)
+                    list_containers.append(self._interp_event_list(commEvt))
                 return list_containers
-            elif isinstance(data[1], Item):
-                main_container = TranslationContainer(tl_type="item", data={})
-                for itemidx, item in tqdm.tqdm(enumerate(data), desc="Items Processed"):
-                    if not item or not isinstance(item, Item):
-                        list_containers.append(None)
-                        continue
-                    item_data = [item.name, item.description, item.note]
-                    if any(item_data):
-                        main_container.data[f"IT_{str(itemidx).zfill(4)}"] = item_data
-                return [main_container]
+            elif type(data[1]) in DATABASE_FIELDS:
+                return self._prepare_database(data, *DATABASE_FIELDS[type(data[1])])
@@ -1,6 +1,6 @@
-from typing import List, Optional
+from typing import Any, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
 from .EventsModels.EventBase import EventBase
 
@@ -135,6 +135,20 @@ class Armor(BaseModel):
     price: int
 
 
+class Weapon(BaseModel):
+    id: int
+    animationId: int
+    description: str
+    etypeId: int
+    traits: List[Trait]
+    iconIndex: int
+    name: str
+    note: str
+    params: List[int]
+    price: int
+    wtypeId: int
+
+
 class LearnSkill(BaseModel):
     level: int
     note: str
@@ -181,4 +195,52 @@ class MapFile(BaseModel):
     events: List[Optional[Events]]
 
 
+class RawPage:
+    """Map event page that keeps the original json.
+
+    Only the command list is validated (on access). Setting the list writes the
+    re-compiled commands back into the original json.
+    """
+
+    __slots__ = ("raw",)
+
+    # Shared so the validator is only built once.
+    commands = TypeAdapter(List[EventBase])
+
+    def __init__(self, raw: dict) -> None:
+        self.raw = raw
+
+    @property
+    def list(self) -> List[EventBase]:
+        return self.commands.validate_python(self.raw["list"])
+
+    @list.setter
+    def list(self, value: List[EventBase]):
+        self.raw["list"] = [command.to_json() for command in value]
+
+
+class RawEvents:
+    __slots__ = ("raw", "pages")
+
+    def __init__(self, raw: dict) -> None:
+        self.raw = raw
+        self.pages = [RawPage(page) for page in raw["pages"]]
+
+
+class RawMapFile:
+    """Fast path for MapFile.
+
+    Skips validating (and later dumping) the tile data, move routes and the rest of the map.
+    Everything but events[*].pages[*].list is kept as the original json.
+    """
+
+    __slots__ = ("raw", "events")
+
+    def __init__(self, raw: dict[str, Any]) -> None:
+        self.raw = raw
+        self.events: List[Optional[RawEvents]] = [
+            RawEvents(event) if event else None for event in raw["events"]
+        ]
+
+
 # Lists are just RootModels
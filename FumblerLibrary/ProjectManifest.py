@@ -0,0 +1,161 @@
+import hashlib
+import os
+import pathlib
+from typing import Any
+
+import orjson
+from loguru import logger
+
+from FumblerLibrary.FumblerModels import TranslationContainer
+
+
+class ProjectManifest:
+    """Content hashes of every translated file, page and line, with the applied translations.
+
+    Written to `outputs/rpgmaker_manifest.json` after every run. With `--incremental`, files whose
+    hash did not change are skipped, and lines that were translated before (in any file) are
+    reused so only new or changed lines are sent. Files that are not in the manifest yet fall back
+    to the translations in their previous `_dump` mapping.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        # file -> {"source": hash, "pages": {container index: hash}, "lines": {line hash: translation}}
+        self.files: dict[str, dict[str, Any]] = {}
+        if path.exists():
+            try:
+                self.files = orjson.loads(path.read_bytes())["files"]
+            except (orjson.JSONDecodeError, KeyError):
+                logger.warning(f"Ignoring broken manifest: {path}")
+        self.lines: dict[str, Any] = {}
+        for entry in self.files.values():
+            self.lines.update(entry["lines"])
+        self.reused = 0
+        self.sent = 0
+
+    @staticmethod
+    def hash_file(file: pathlib.Path) -> str:
+        return hashlib.sha256(file.read_bytes()).hexdigest()
+
+    @staticmethod
+    def hash_line(tl_type: str, value: Any) -> str:
+        return hashlib.blake2b(
+            orjson.dumps([tl_type, value]), digest_size=16
+        ).hexdigest()
+
+    @staticmethod
+    def hash_page(container: TranslationContainer) -> str:
+        return hashlib.blake2b(
+            orjson.dumps(
+                [container.tl_type, container.data], option=orjson.OPT_SORT_KEYS
+            ),
+            digest_size=16,
+        ).hexdigest()
+
+    def is_unchanged(self, file: pathlib.Path, output_folder: pathlib.Path) -> bool:
+        entry = self.files.get(file.name)
+        return (
+            entry is not None
+            and (output_folder / file.name).exists()
+            and entry["source"] == self.hash_file(file)
+        )
+
+    @staticmethod
+    def load_dump(dump_file: pathlib.Path) -> dict[str, Any]:
+        """Reads a previous `_dump` mapping. Keys of list lines are python tuple reprs."""
+        if not dump_file.exists():
+            return {}
+        try:
+            return orjson.loads(dump_file.read_bytes())
+        except orjson.JSONDecodeError:
+            logger.warning(f"Ignoring broken dump mapping: {dump_file}")
+            return {}
+
+    def split(
+        self,
+        file: pathlib.Path,
+        containers: list[TranslationContainer | None],
+        dump_file: pathlib.Path,
+    ) -> tuple[list[TranslationContainer | None], list[dict[str, Any]]]:
+        """Splits prepared containers into lines to send and lines to reuse.
+
+        Args:
+            file (pathlib.Path): File the containers were prepared from.
+            containers (list[TranslationContainer | None]): Prepared containers.
+            dump_file (pathlib.Path): Previous `_dump` mapping of the file.
+
+        Returns:
+            tuple[list[TranslationContainer | None], list[dict[str, Any]]]: Containers (at the same
+                index) with only the lines that have to be translated, and the reused translations
+                per container.
+        """
+        dump = self.load_dump(dump_file) if file.name not in self.files else {}
+        if dump:
+            logger.info(f"No manifest entry for {file.name}, reusing {dump_file.name}.")
+        pages = self.files.get(file.name, {}).get("pages", {})
+        changed_pages = 0
+        todo: list[TranslationContainer | None] = []
+        reused: list[dict[str, Any]] = []
+        for idx, container in enumerate(containers):
+            if not container:
+                todo.append(None)
+                reused.append({})
+                continue
+            if pages.get(str(idx)) != self.hash_page(container):
+                changed_pages += 1
+            found: dict[str, Any] = {}
+            missing: dict[str, Any] = {}
+            for k, v in container.data.items():
+                line = self.hash_line(container.tl_type, v)
+                if line in self.lines:
+                    found[k] = self.lines[line]
+                elif dump:
+                    key = str(tuple(v)) if isinstance(v, list) else str(v)
+                    if key in dump:
+                        found[k] = dump[key]
+                    else:
+                        missing[k] = v
+                else:
+                    missing[k] = v
+            todo.append(
+                TranslationContainer(tl_type=container.tl_type, data=missing)
+                if missing
+                else None
+            )
+            reused.append(found)
+        lines_reused = sum(len(i) for i in reused)
+        lines_sent = sum(len(i.data) for i in todo if i)
+        self.reused += lines_reused
+        self.sent += lines_sent
+        logger.info(
+            f"Incremental: {file.name} has {changed_pages} new or changed pages, "
+            f"reusing {lines_reused} lines and sending {lines_sent}."
+        )
+        return todo, reused
+
+    def record(self, file: pathlib.Path, containers: list[TranslationContainer | None]):
+        """Records the translations applied to a file. Lines that failed are left out."""
+        pages: dict[str, str] = {}
+        lines: dict[str, Any] = {}
+        for idx, container in enumerate(containers):
+            if not container:
+                continue
+            pages[str(idx)] = self.hash_page(container)
+            for k, v in container.data.items():
+                if k in container.translated:
+                    lines[self.hash_line(container.tl_type, v)] = container.translated[k]
+        self.files[file.name] = {
+            "source": self.hash_file(file),
+            "pages": pages,
+            "lines": lines,
+        }
+        self.lines.update(lines)
+
+    def save(self):
+        temp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        temp.write_bytes(orjson.dumps({"version": 1, "files": self.files}))
+        os.replace(temp, self.path)
+        if self.reused or self.sent:
+            logger.info(
+                f"Incremental: reused {self.reused} lines, sent {self.sent} new or changed lines."
+            )
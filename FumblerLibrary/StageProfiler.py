@@ -0,0 +1,173 @@
+import collections
+import contextlib
+import contextvars
+import cProfile
+import io
+import pathlib
+import pstats
+import threading
+import time
+
+from loguru import logger
+
+# File the current span is for. Nested spans (e.g. decompile within prepare) inherit it.
+current_file: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_file", default=""
+)
+
+
+def peak_rss() -> int:
+    """Peak RSS of this process as reported by getrusage (KB, bytes on macOS). 0 if unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class StageProfiler:
+    """Wall time spans per pipeline stage and file.
+
+    Spans are always timed (the overhead is a couple of `perf_counter` calls). With `profile`,
+    CPU bound spans are also run under cProfile, one profile per stage and file. Only the outermost
+    CPU span of a thread is profiled since cProfile cannot be nested.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self, profile: bool = False):
+        self.profile = profile
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # stage -> file -> [calls, total, max]
+        self.spans: dict[str, dict[str, list[float]]] = collections.defaultdict(
+            lambda: collections.defaultdict(lambda: [0, 0.0, 0.0])
+        )
+        self.profiles: dict[tuple[str, str], pstats.Stats] = {}
+        # Largest peak RSS (ru_maxrss) reported by the processes merged in.
+        self.merged_peak_rss = 0
+
+    @contextlib.contextmanager
+    def span(self, stage: str, file: str | None = None, cpu: bool = True):
+        """Times a stage.
+
+        Args:
+            stage (str): Stage name.
+            file (str | None): File the stage is working on. Inherited from the outer span if None.
+            cpu (bool): False for spans that mostly wait (network). Those are never profiled.
+        """
+        token = current_file.set(file) if file is not None else None
+        file = current_file.get()
+        profiler = None
+        if self.profile and cpu and not getattr(self.local, "active", False):
+            self.local.active = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            if profiler is not None:
+                profiler.disable()
+                self.local.active = False
+            with self.lock:
+                span = self.spans[stage][file]
+                span[0] += 1
+                span[1] += elapsed
+                span[2] = max(span[2], elapsed)
+                if profiler is not None:
+                    stats = self.profiles.get((stage, file))
+                    if stats is None:
+                        self.profiles[(stage, file)] = pstats.Stats(profiler)
+                    else:
+                        stats.add(profiler)
+            if token is not None:
+                current_file.reset(token)
+
+    def export(self) -> dict:
+        """Spans and profiles recorded so far as plain (picklable) data for `merge`."""
+        with self.lock:
+            return {
+                "spans": {
+                    stage: {file: list(span) for file, span in files.items()}
+                    for stage, files in self.spans.items()
+                },
+                "profiles": {key: stats.stats for key, stats in self.profiles.items()},  # type: ignore
+                "peak_rss": peak_rss(),
+            }
+
+    def merge(self, exported: dict):
+        """Adds spans and profiles recorded by another process."""
+        with self.lock:
+            for stage, files in exported["spans"].items():
+                for file, (calls, total, peak) in files.items():
+                    span = self.spans[stage][file]
+                    span[0] += calls
+                    span[1] += total
+                    span[2] = max(span[2], peak)
+            self.merged_peak_rss = max(self.merged_peak_rss, exported["peak_rss"])
+            for key, raw in exported["profiles"].items():
+                incoming = pstats.Stats()
+                incoming.stats = raw  # type: ignore
+                incoming.get_top_level_stats()
+                if key in self.profiles:
+                    self.profiles[key].add(incoming)
+                else:
+                    self.profiles[key] = incoming
+
+    def summary(self):
+        wall = time.perf_counter() - self.started
+        if not self.spans:
+            return
+        lines = [
+            f"{'stage':<12}{'files':>6}{'calls':>8}{'total s':>10}{'mean ms':>10}{'max ms':>10}{'% wall':>8}"
+        ]
+        for stage, files in self.spans.items():
+            calls = sum(int(span[0]) for span in files.values())
+            total = sum(span[1] for span in files.values())
+            peak = max(span[2] for span in files.values())
+            lines.append(
+                f"{stage:<12}{len(files):>6}{calls:>8}{total:>10.3f}"
+                f"{total / calls * 1000:>10.2f}{peak * 1000:>10.2f}{total / wall * 100:>7.1f}%"
+            )
+        lines.append(f"{'wall':<12}{'':>6}{'':>8}{wall:>10.3f}")
+        # Files overlap (and translate overlaps everything), so stages do not add up to wall time.
+        logger.info("Stage timings (stages overlap across files):\n" + "\n".join(lines))
+        slowest = sorted(
+            (
+                (span[1], stage, file)
+                for stage, files in self.spans.items()
+                if stage != "translate"
+                for file, span in files.items()
+            ),
+            reverse=True,
+        )[:5]
+        if slowest:
+            logger.info(
+                "Slowest local stages: "
+                + ", ".join(f"{stage} {file} {total:.3f}s" for total, stage, file in slowest)
+            )
+
+    def dump_profiles(self, folder: pathlib.Path, top: int = 8):
+        """Writes every profile as `<file>.<stage>.prof` and logs the top functions per stage."""
+        if not self.profiles:
+            return
+        folder.mkdir(parents=True, exist_ok=True)
+        merged: dict[str, tuple[pstats.Stats, io.StringIO]] = {}
+        for (stage, file), stats in self.profiles.items():
+            stats.dump_stats(folder / f"{file or 'run'}.{stage}.prof")
+            if stage not in merged:
+                stream = io.StringIO()
+                merged[stage] = (pstats.Stats(stream=stream), stream)
+            merged[stage][0].add(stats)
+        for stage, (stats, stream) in merged.items():
+            stats.sort_stats("cumulative").print_stats(top)
+            logger.info(f"Profile for {stage} (all files):\n{stream.getvalue().strip()}")
+        logger.info(f"Profiles written to {folder} (open with snakeviz or pstats).")
+
+
+# Shared by the pipeline and the parsers.
+stages = StageProfiler()
@@ -0,0 +1,151 @@
+import asyncio
+import concurrent.futures
+import pathlib
+import pickle
+from typing import Any
+
+import orjson
+
+from FumblerLibrary.FumblerModels import TomlConfig, TranslationContainer
+from FumblerLibrary.OutputWriter import dumps_output
+from FumblerLibrary.StageProfiler import stages
+
+# Set in every worker process by init_worker.
+_parser: Any = None
+
+
+def init_worker(parser_cls: type, config: TomlConfig, profile: bool):
+    global _parser
+    _parser = parser_cls([], config)
+    stages.reset(profile=profile)
+
+
+def prepare_file(parser, file: pathlib.Path) -> tuple[Any, list] | None:
+    with stages.span("parse", file.name):
+        parsed_data = parser.load_file(file)
+    if parsed_data is None:
+        return None
+    with stages.span("prepare", file.name):
+        containers = parser.prepare_tl_containers(parsed_data)
+    if not containers:
+        return None
+    return parsed_data, containers
+
+
+def apply_file(
+    parser, file: pathlib.Path, parsed_data: Any, containers: list
+) -> tuple[bytes, bytes]:
+    with stages.span("apply", file.name):
+        parsed_data = parser.apply_tl_containers(parsed_data, containers)
+    with stages.span("dump", file.name):
+        output = dumps_output(
+            parser.dump_data(parsed_data), parser.config.pipeline.compact_output
+        )
+        mapping = orjson.dumps(
+            parser.get_full_mapping(containers, json=True),
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+        )
+    return output, mapping
+
+
+def prepare_in_worker(file: pathlib.Path):
+    stages.reset(profile=stages.profile)
+    prepared = prepare_file(_parser, file)
+    if prepared is None:
+        return None, None, stages.export()
+    with stages.span("pickle", file.name):
+        state = pickle.dumps(prepared, protocol=pickle.HIGHEST_PROTOCOL)
+    # Only what the translator needs goes back as objects.
+    payloads = [
+        (container.tl_type, container.data) if container else None
+        for container in prepared[1]
+    ]
+    return state, payloads, stages.export()
+
+
+def apply_in_worker(file: pathlib.Path, state: bytes, translated: list):
+    stages.reset(profile=stages.profile)
+    with stages.span("pickle", file.name):
+        parsed_data, containers = pickle.loads(state)
+    del state
+    for container, container_tl in zip(containers, translated):
+        if container:
+            container.translated = container_tl
+    return apply_file(_parser, file, parsed_data, containers), stages.export()
+
+
+class StageWorkers:
+    """Runs the CPU bound per-file stages (parse, prepare, apply, dump) off the event loop.
+
+    With `pipeline.workers` above 0 the stages run in a process pool, so the event loop only has
+    to stream responses. Between prepare and apply, the parsed file and its decompiled events stay
+    pickled in the main process. Only the containers' lines are unpickled there.
+    With 0 workers the stages run in a thread instead (which still holds the GIL).
+    """
+
+    def __init__(
+        self, parser_cls: type, config: TomlConfig, workers: int, profile: bool = False
+    ) -> None:
+        self.parser = parser_cls([], config)
+        self.pool: concurrent.futures.ProcessPoolExecutor | None = None
+        if workers > 0:
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=init_worker,
+                initargs=(parser_cls, config, profile),
+            )
+
+    async def prepare(
+        self, file: pathlib.Path
+    ) -> tuple[Any, list[TranslationContainer | None]] | None:
+        """Loads and prepares a file.
+
+        Returns:
+            tuple[Any, list[TranslationContainer | None]] | None: State to pass to `apply` and
+                the prepared containers. None if the file is not supported or has nothing to translate.
+        """
+        if self.pool is None:
+            return await asyncio.to_thread(prepare_file, self.parser, file)
+        state, payloads, exported = await asyncio.get_running_loop().run_in_executor(
+            self.pool, prepare_in_worker, file
+        )
+        stages.merge(exported)
+        if state is None:
+            return None
+        containers = [
+            TranslationContainer.model_construct(
+                tl_type=payload[0], data=payload[1], translated={}
+            )
+            if payload
+            else None
+            for payload in payloads
+        ]
+        return state, containers
+
+    async def apply(
+        self,
+        file: pathlib.Path,
+        state: Any,
+        containers: list[TranslationContainer | None],
+    ) -> tuple[bytes, bytes]:
+        """Applies the translated containers and dumps the file.
+
+        Returns:
+            tuple[bytes, bytes]: The translated file and the original -> translated mapping as json.
+        """
+        if self.pool is None:
+            return await asyncio.to_thread(
+                apply_file, self.parser, file, state, containers
+            )
+        translated = [
+            container.translated if container else None for container in containers
+        ]
+        output, exported = await asyncio.get_running_loop().run_in_executor(
+            self.pool, apply_in_worker, file, state, translated
+        )
+        stages.merge(exported)
+        return output
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,119 @@
+import asyncio
+import pathlib
+from typing import Any
+
+import orjson
+from loguru import logger
+
+from FumblerLibrary.FumblerModels import TranslationContainer
+
+
+class TranslationPlanner:
+    """Plans the translation work across every file.
+
+    Games tend to repeat the same lines (shop greetings, "…？！", copy-pasted NPC pages)
+    across maps and common events. The planner collapses identical lines/name-text pairs/choices
+    so that each unique item is translated once for the whole run, then fans the results back
+    out into the original containers.
+
+    Files are planned as they are loaded. A line that was already claimed by an earlier file
+    (even if it is still being translated) is not sent again; the later file waits for it instead.
+    """
+
+    def __init__(self) -> None:
+        self.lines: dict[tuple[str, bytes], asyncio.Future] = {}
+        self.total_lines = 0
+
+    @property
+    def unique_lines(self):
+        return len(self.lines)
+
+    @staticmethod
+    def identity(tl_type: str, value: Any) -> tuple[str, bytes]:
+        # Mode is part of the identity since prompts differ between modes.
+        return tl_type, orjson.dumps(value)
+
+    def claim(
+        self, file: pathlib.Path, containers: list[TranslationContainer | None]
+    ) -> list[TranslationContainer | None]:
+        """Builds the deduplicated work containers for a file.
+
+        The first container a line appears in keeps it (with the same key).
+        Later duplicates are dropped from their own containers.
+
+        Args:
+            file (pathlib.Path): File the containers were prepared from.
+            containers (list[TranslationContainer | None]): Prepared containers.
+
+        Returns:
+            list[TranslationContainer | None]: Work containers to be translated.
+        """
+        loop = asyncio.get_running_loop()
+        work: list[TranslationContainer | None] = []
+        file_lines = 0
+        for idx, container in enumerate(containers):
+            if not container:
+                continue
+            work_data = {}
+            for k, v in container.data.items():
+                file_lines += 1
+                ident = self.identity(container.tl_type, v)
+                if ident in self.lines:
+                    continue
+                self.lines[ident] = loop.create_future()
+                work_data[k] = v
+            if work_data:
+                work.append(
+                    TranslationContainer(
+                        tl_type=container.tl_type,
+                        data=work_data,
+                        origin=(file.name, idx),
+                    )
+                )
+        self.total_lines += file_lines
+        logger.info(
+            f"Planned: {sum(len(i.data) for i in work if i)} unique lines out of "
+            f"{file_lines} in {len(work)} containers for {file.name}."
+        )
+        return work
+
+    def resolve(self, work: list[TranslationContainer | None]):
+        """Publishes translated work so other files can use it.
+
+        Lines that failed to translate are resolved with None.
+
+        Args:
+            work (list[TranslationContainer | None]): Work containers from claim().
+        """
+        for container in work:
+            if not container:
+                continue
+            translated = {k.upper(): v for k, v in (container.translated or {}).items()}
+            for k, v in container.data.items():
+                future = self.lines[self.identity(container.tl_type, v)]
+                if not future.done():
+                    future.set_result(translated.get(k.upper()))
+
+    async def fan_out(self, containers: list[TranslationContainer | None]):
+        """Copies translations into every line of the original containers.
+
+        Waits for lines that are still being translated for another file.
+
+        Args:
+            containers (list[TranslationContainer | None]): Prepared containers for a file.
+        """
+        for container in containers:
+            if not container:
+                continue
+            translated = {}
+            for k, v in container.data.items():
+                result = await self.lines[self.identity(container.tl_type, v)]
+                if result is not None:
+                    translated[k] = result
+            container.translated = translated
+
+    def summary(self):
+        logger.info(
+            f"Planned: {self.unique_lines} unique lines out of {self.total_lines} "
+            f"({self.total_lines - self.unique_lines} duplicates)."
+        )
@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+from loguru import logger
+
+
+class AdaptiveLimiter:
+    """AIMD in-flight limit driven by endpoint feedback.
+
+    - Additive increase: +1 after a window of requests where throughput kept improving.
+    - Multiplicative decrease: on errors/timeouts/dropped streams, or when latency per token
+      rises well above the best seen so far.
+
+    With adaptive disabled, this is a fixed limit (same as a semaphore).
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        adaptive: bool = True,
+        latency_tolerance: float = 2.0,
+        decrease_factor: float = 0.5,
+    ) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.adaptive = adaptive
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        if not adaptive:
+            self.maximum = self.minimum = self.limit
+        self.in_use = 0
+        self.cond = asyncio.Condition()
+        # (time, limit) every time the limit changes.
+        self.history: list[tuple[float, int]] = [(time.time(), self.limit)]
+
+        self.window_start = time.monotonic()
+        self.window: list[tuple[float, int]] = []
+        self.last_throughput = 0.0
+        self.best_latency: float | None = None
+        self.cooldown_until = 0.0
+
+    async def acquire(self):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.in_use < self.limit)
+            self.in_use += 1
+
+    async def release(self):
+        async with self.cond:
+            self.in_use -= 1
+            self.cond.notify_all()
+
+    def set_limit(self, limit: int, reason: str):
+        limit = min(max(limit, self.minimum), self.maximum)
+        if limit == self.limit:
+            return
+        logger.info(f"Concurrency limit: {self.limit} -> {limit} ({reason})")
+        self.limit = limit
+        self.history.append((time.time(), limit))
+        self.reset_window()
+
+    def reset_window(self):
+        self.window = []
+        self.window_start = time.monotonic()
+
+    def on_success(self, latency: float, tokens: int):
+        """Feedback for a finished request.
+
+        Args:
+            latency (float): Seconds from sending the request to the end of the stream.
+            tokens (int): Generated tokens (or an estimate).
+        """
+        if not self.adaptive:
+            return
+        self.window.append((latency, max(1, tokens)))
+        if len(self.window) < max(4, self.limit):
+            return
+        elapsed = max(time.monotonic() - self.window_start, 1e-6)
+        total_tokens = sum(tokens for _, tokens in self.window)
+        throughput = total_tokens / elapsed
+        latency_per_token = sum(latency for latency, _ in self.window) / total_tokens
+        logger.debug(
+            f"Concurrency window: limit {self.limit}, {throughput:.1f} tokens/s, {latency_per_token * 1000:.1f} ms/token"
+        )
+        if self.best_latency is None or latency_per_token < self.best_latency:
+            self.best_latency = latency_per_token
+        previous, self.last_throughput = self.last_throughput, throughput
+        self.reset_window()
+        if latency_per_token > self.best_latency * self.latency_tolerance:
+            self.decrease("latency rising")
+        elif throughput > previous * 1.05 and self.in_use >= self.limit - 1:
+            self.set_limit(self.limit + 1, f"{throughput:.1f} tokens/s")
+
+    def on_error(self, reason: str):
+        """Feedback for a failed request (error, timeout, dropped stream)."""
+        if not self.adaptive:
+            return
+        self.decrease(reason)
+
+    def decrease(self, reason: str):
+        now = time.monotonic()
+        # One decrease per burst of failures. Requests already in-flight will fail together.
+        if now < self.cooldown_until:
+            return
+        self.cooldown_until = now + 5
+        self.last_throughput = 0.0
+        self.set_limit(int(self.limit * self.decrease_factor), reason)
@@ -0,0 +1,109 @@
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+
+from FumblerLibrary.Translators.AdaptiveLimiter import AdaptiveLimiter
+from FumblerLibrary.Translators.RequestMetrics import queue_wait
+
+
+class ChunkScheduler:
+    """Global queue of ready requests with a hard in-flight cap.
+
+    Every container (from every file) submits its next chunk request here. Workers pull
+    from the queue and only run once the limiter allows it, so the number of in-flight completions
+    never exceeds the (possibly adaptive) limit no matter how many files or containers are active.
+
+    Containers submit chunk k+1 only after chunk k finished, so history ordering is kept.
+    """
+
+    def __init__(self, limiter: AdaptiveLimiter) -> None:
+        self.limiter = limiter
+        self.queue: asyncio.Queue[
+            tuple[
+                Callable[[], Awaitable[Any]],
+                asyncio.Future,
+                float,
+                contextvars.Context,
+            ]
+        ] = asyncio.Queue()
+        self.workers: list[asyncio.Task] = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.queue_wait = 0.0
+
+    def start(self):
+        if self.workers:
+            return
+        loop = asyncio.get_running_loop()
+        self.workers = [
+            loop.create_task(self.worker()) for _ in range(self.limiter.maximum)
+        ]
+
+    async def submit(self, job: Callable[[], Awaitable[Any]]) -> Any:
+        """Queues a request and waits for its result.
+
+        Args:
+            job (Callable[[], Awaitable[Any]]): Coroutine function doing a single request.
+
+        Returns:
+            Any: Whatever the job returns. Exceptions are re-raised to the submitter.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        # Jobs run in the submitter's context (request labels for metrics).
+        await self.queue.put(
+            (job, future, time.monotonic(), contextvars.copy_context())
+        )
+        return await future
+
+    async def worker(self):
+        while True:
+            job, future, queued_at, context = await self.queue.get()
+            if future.cancelled():
+                continue
+            await self.limiter.acquire()
+            waited = time.monotonic() - queued_at
+            self.queue_wait += waited
+            context.run(queue_wait.set, waited)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            # The task copies the context it is created in.
+            task = context.run(asyncio.get_running_loop().create_task, job())
+            # Submitter gave up (e.g. chunk deadline). Stop the request too.
+            future.add_done_callback(
+                lambda f, task=task: f.cancelled() and task.cancel()
+            )
+            try:
+                try:
+                    # A cancelled job only shows in task.cancelled(), so CancelledError here
+                    # always means the worker itself is being stopped.
+                    await asyncio.wait((task,))
+                except asyncio.CancelledError:
+                    task.cancel()
+                    raise
+                if task.cancelled():
+                    if not future.done():
+                        future.cancel()
+                elif task.exception() is not None:
+                    if not future.done():
+                        future.set_exception(task.exception())
+                elif not future.done():
+                    future.set_result(task.result())
+            finally:
+                self.in_flight -= 1
+                self.completed += 1
+                await self.limiter.release()
+
+    def close(self):
+        for worker in self.workers:
+            worker.cancel()
+        self.workers = []
+        if self.completed:
+            logger.info(
+                f"Scheduler: {self.completed} requests, peak in-flight {self.peak_in_flight}/{self.limiter.maximum}, "
+                f"avg queue wait {self.queue_wait / self.completed:.2f}s"
+            )
@@ -0,0 +1,89 @@
+import collections
+from typing import Any
+
+
+class AhoCorasick:
+    """Minimal Aho-Corasick automaton. Finds every word occurring in a text in one pass."""
+
+    def __init__(self, words: list[str]) -> None:
+        self.goto: list[dict[str, int]] = [{}]
+        self.fail: list[int] = [0]
+        self.out: list[set[str]] = [set()]
+        for word in words:
+            node = 0
+            for ch in word:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(set())
+                node = nxt
+            self.out[node].add(word)
+        # Breadth first to build the failure links.
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                fail = self.fail[node]
+                while fail and ch not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[nxt] = self.goto[fail].get(ch, 0)
+                self.out[nxt] |= self.out[self.fail[nxt]]
+
+    def find(self, text: str) -> set[str]:
+        found: set[str] = set()
+        node = 0
+        for ch in text:
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            if self.out[node]:
+                found |= self.out[node]
+        return found
+
+
+class Glossary:
+    """Index over the knowledge db to only inject the terms used by a chunk.
+
+    `XX` in a key is a wildcard (usually a name), e.g. "XX様". Such terms match when every
+    fragment around the wildcards ("様") occurs in the chunk.
+    """
+
+    wildcard = "XX"
+
+    def __init__(self, db: dict[str, str]) -> None:
+        self.db = db
+        self.fragments: dict[str, list[str]] = {}
+        self.always: list[str] = []
+        for key in db:
+            fragments = [f for f in key.split(self.wildcard) if f]
+            if not fragments:
+                self.always.append(key)
+            else:
+                self.fragments[key] = fragments
+        self.automaton = AhoCorasick(
+            list({f for fragments in self.fragments.values() for f in fragments})
+        )
+
+    @staticmethod
+    def chunk_text(chunk: dict[str, Any]) -> str:
+        lines = []
+        for v in chunk.values():
+            if isinstance(v, list):
+                lines.extend(i for i in v if isinstance(i, str))
+            elif isinstance(v, str):
+                lines.append(v)
+        return "\n".join(lines)
+
+    def terms_for(self, chunk: dict[str, Any]) -> dict[str, str]:
+        """Terms of the db that occur in the chunk's source lines (in db order)."""
+        found = self.automaton.find(self.chunk_text(chunk))
+        return {
+            key: value
+            for key, value in self.db.items()
+            if key in self.always
+            or (key in self.fragments and all(f in found for f in self.fragments[key]))
+        }
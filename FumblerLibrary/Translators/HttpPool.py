@@ -0,0 +1,80 @@
+import time
+
+import httpx
+from loguru import logger
+
+from FumblerLibrary.FumblerModels import ApiConfig
+
+
+class HttpPool:
+    """The one http client every request of a run goes through.
+
+    The pool holds as many connections as the scheduler can have requests in flight, and keeps
+    them alive between chunks, so a run only pays for the TCP (and TLS) setup once per slot.
+    New connections and requests are counted through httpcore's `trace` extension.
+    """
+
+    def __init__(self, config: ApiConfig, connections: int) -> None:
+        http2 = config.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning(
+                    "api.http2 is set but `h2` is not installed (pip install httpx[http2]). Using HTTP/1.1."
+                )
+                http2 = False
+        self.timeout = httpx.Timeout(config.read_timeout, connect=config.connect_timeout)
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=connections,
+                max_keepalive_connections=connections,
+                keepalive_expiry=config.keepalive_expiry,
+            ),
+            event_hooks={"request": [self.on_request]},
+        )
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+        self.connect_failures = 0
+        # Time spent opening connections (TCP connect and TLS handshake).
+        self.connect_seconds = 0.0
+
+    async def on_request(self, request: httpx.Request):
+        started: dict[str, float] = {}
+
+        async def trace(event: str, info: dict):
+            step, _, state = event.rpartition(".")
+            if state == "started":
+                started[step] = time.monotonic()
+                if step.endswith(".send_request_headers"):
+                    self.requests += 1
+            elif step in ("connection.connect_tcp", "connection.start_tls"):
+                now = time.monotonic()
+                self.connect_seconds += now - started.pop(step, now)
+                if state == "failed":
+                    self.connect_failures += 1
+                elif step == "connection.connect_tcp":
+                    self.connections += 1
+                else:
+                    self.tls_handshakes += 1
+
+        request.extensions["trace"] = trace
+
+    @property
+    def stats(self):
+        reused = max(self.requests - self.connections, 0)
+        return {
+            "requests": self.requests,
+            "connections": self.connections,
+            "reused": reused,
+            "reuse_rate": round(reused / self.requests, 4) if self.requests else 0.0,
+            "tls_handshakes": self.tls_handshakes,
+            "connect_failures": self.connect_failures,
+            "connect_seconds": round(self.connect_seconds, 3),
+        }
+
+    async def close(self):
+        await self.client.aclose()
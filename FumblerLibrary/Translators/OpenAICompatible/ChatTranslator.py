@@ -0,0 +1,120 @@
+from typing import Any, Callable
+
+from loguru import logger
+
+from FumblerLibrary.Translators.OpenAICompatible.Translator import OAICompatTranslator
+from FumblerLibrary.Translators.RetryPolicy import RetryBudget
+
+
+class OAIChatTranslator(OAICompatTranslator):
+    """Translator using chat completions. Used when no prompt template is set.
+
+    The server applies its own chat template. Where supported, each request is constrained to a
+    json schema built from the chunk's exact keys and value shapes (`api.structured_output`), so
+    the response is always a json object with the right keys and types.
+    """
+
+    structured_modes = ("response_format", "guided_json", "json_schema", "none")
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.structured = self.config.api.structured_output
+        if self.structured not in self.structured_modes:
+            logger.warning(
+                f"Unknown structured_output {self.structured}. Expected one of {self.structured_modes}."
+            )
+            self.structured = "none"
+
+    @classmethod
+    def value_schema(cls, value: Any) -> dict[str, Any]:
+        if isinstance(value, str):
+            return {"type": "string"}
+        elif isinstance(value, list):
+            return {
+                "type": "array",
+                "items": cls.value_schema(value[0]) if value else {},
+                "minItems": len(value),
+                "maxItems": len(value),
+            }
+        elif isinstance(value, dict):
+            return cls.chunk_schema(value)
+        elif value is None:
+            return {"type": "null"}
+        elif isinstance(value, bool):
+            return {"type": "boolean"}
+        return {"type": "number"}
+
+    @classmethod
+    def chunk_schema(cls, chunk: dict[str, Any]) -> dict[str, Any]:
+        """Json schema with exactly the keys of the chunk and the shape of each value."""
+        return {
+            "type": "object",
+            "properties": {k: cls.value_schema(v) for k, v in chunk.items()},
+            "required": list(chunk),
+            "additionalProperties": False,
+        }
+
+    def structured_params(self, pending: dict) -> dict[str, Any]:
+        schema = self.chunk_schema(pending)
+        if self.structured == "response_format":
+            return {
+                "response_format": {
+                    "type": "json_schema",
+                    "json_schema": {
+                        "name": "translation",
+                        "schema": schema,
+                        "strict": True,
+                    },
+                }
+            }
+        elif self.structured == "guided_json":
+            return {"guided_json": schema}
+        elif self.structured == "json_schema":
+            return {"json_schema": schema}
+        return {}
+
+    @staticmethod
+    def stream_delta(chunk) -> str:
+        return chunk.choices[0].delta.content or ""
+
+    def extract_json(self, response: str) -> str | None:
+        stripped = response.strip()
+        if stripped.startswith("{"):
+            # Constrained responses are the json object itself.
+            return stripped
+        return super().extract_json(response)
+
+    async def request_chat_completion(
+        self, messages: list[dict[str, str]], pending: dict
+    ):
+        return await self.request_stream(
+            lambda: self.oai.chat.completions.create(
+                model=self.config.api.model,
+                messages=messages,
+                stream=True,
+                stream_options=self.stream_options,
+                extra_body={
+                    **self.config.api.params,
+                    **self.structured_params(pending),
+                },
+            ),
+            # Unconstrained responses start with a fence, which the validator does not expect.
+            pending if self.structured != "none" else None,
+            "\n".join(message["content"] for message in messages),
+        )
+
+    async def request_chunk(
+        self,
+        build_messages: Callable[[dict], list[dict[str, str]]],
+        raw_chunk: dict,
+        retry: RetryBudget,
+    ) -> dict | None:
+        async def request(pending: dict):
+            messages = build_messages(pending)
+            return await self.scheduler.submit(
+                lambda: retry.run(
+                    lambda: self.request_chat_completion(messages, pending)
+                )
+            )
+
+        return await self.do_retryable_completion_text(request, raw_chunk, retry)
@@ -0,0 +1,86 @@
+import jinja2
+from loguru import logger
+
+PROBE = {"role": "user", "content": "\x00probe\x00"}
+
+
+class PromptRenderer:
+    """Renders chat templates one message at a time.
+
+    Re-rendering the whole conversation for every chunk is wasteful since the system prompt
+    and history are the same across requests. Each message is rendered once into a segment
+    and prompts are built by joining segments, which also keeps the prefix byte-identical
+    for prefix caching (KoboldCpp/tabbyAPI/vLLM).
+
+    Templates where that does not hold (checked once on init) are rendered fully every time.
+    """
+
+    max_segments = 4096
+
+    def __init__(self, template: jinja2.Template) -> None:
+        self.template = template
+        self.segments: dict[tuple[str, str], str] = {}
+        module = self.make_module(
+            [{"role": "system", "content": "system"}, {"role": "user", "content": "user"}]
+        )
+        self.stop_strings: list[str] = getattr(module, "stop_strings", [])
+        self.probe_tail = str(self.make_module([PROBE]))
+        self.incremental = self.check()
+        if not self.incremental:
+            logger.warning(
+                "Chat template cannot be rendered incrementally. Falling back to full renders."
+            )
+
+    def make_module(self, messages: list[dict[str, str]]):
+        return self.template.make_module(
+            {
+                "add_generation_prompt": True,
+                "stop_strings": [],
+                "messages": messages,
+            }
+        )
+
+    def segment(self, message: dict[str, str]) -> str:
+        key = (message["role"], message["content"])
+        segment = self.segments.get(key)
+        if segment is None:
+            rendered = str(self.make_module([message, PROBE]))
+            if not rendered.endswith(self.probe_tail):
+                raise ValueError("Template is not prefix stable.")
+            segment = rendered[: len(rendered) - len(self.probe_tail)]
+            if len(self.segments) >= self.max_segments:
+                self.segments.clear()
+            self.segments[key] = segment
+        return segment
+
+    def check(self) -> bool:
+        sample = [
+            {"role": "system", "content": "System prompt"},
+            {"role": "user", "content": "User 1"},
+            {"role": "assistant", "content": "Assistant 1"},
+            {"role": "user", "content": "User 2"},
+        ]
+        try:
+            incremental = "".join(self.segment(m) for m in sample[:-1]) + str(
+                self.make_module(sample[-1:])
+            )
+        except (ValueError, jinja2.TemplateError):
+            return False
+        finally:
+            self.segments.clear()
+        return incremental == str(self.make_module(sample))
+
+    def render(self, messages: list[dict[str, str]]) -> str:
+        """Renders the conversation with the generation prompt added.
+
+        Args:
+            messages (list[dict[str, str]]): Chat messages, system prompt first.
+
+        Returns:
+            str: The prompt.
+        """
+        if not self.incremental:
+            return str(self.make_module(messages))
+        return "".join(self.segment(m) for m in messages[:-1]) + str(
+            self.make_module(messages[-1:])
+        )
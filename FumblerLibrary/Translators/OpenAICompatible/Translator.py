@@ -2,7 +2,9 @@ import asyncio
 import collections
 import pathlib
 import re
+import time
 from itertools import islice
+from typing import Awaitable, Callable
 
 import httpx
 import jinja2
@@ -12,16 +14,41 @@ import orjson
 import tqdm
 
 from FumblerLibrary.FumblerModels import TomlConfig, TranslationContainer
+from FumblerLibrary.JobJournal import JobJournal
+from FumblerLibrary.Translators.OpenAICompatible.PromptRenderer import PromptRenderer
+from FumblerLibrary.Translators.AdaptiveLimiter import AdaptiveLimiter
+from FumblerLibrary.Translators.ChunkScheduler import ChunkScheduler
+from FumblerLibrary.Translators.Glossary import Glossary
+from FumblerLibrary.Translators.HttpPool import HttpPool
+from FumblerLibrary.Translators.RequestMetrics import (
+    RequestMetrics,
+    RequestRecord,
+    request_labels,
+)
+from FumblerLibrary.Translators.RetryPolicy import DeadLetter, RetryBudget
+from FumblerLibrary.Translators.StreamValidator import (
+    StreamAborted,
+    StreamState,
+    StreamValidator,
+)
+from FumblerLibrary.Translators.TokenEstimator import TokenEstimator
+from FumblerLibrary.Translators.TranslationMemory import TranslationMemory
 
 
 class OAICompatTranslator:
     translator_dir = pathlib.Path(__file__).resolve().parent
 
-    def __init__(self, config: TomlConfig) -> None:
+    def __init__(
+        self,
+        config: TomlConfig,
+        journal: JobJournal | None = None,
+        dead_letter: DeadLetter | None = None,
+    ) -> None:
         self.config = config
-        self.oai = openai.AsyncOpenAI(api_key=self.config.api.key)
-        self.oai.base_url = self.config.api.host
+        self.journal = journal
+        self.dead_letter = dead_letter
         self.template: jinja2.Template | None
+        self.renderer: PromptRenderer | None = None
         if self.config.prompts.template:
             self.template = jinja2.Template(
                 (
@@ -30,8 +57,55 @@ class OAICompatTranslator:
                     / f"{self.config.prompts.template}.jinja"
                 ).read_text(encoding="utf-8")
             )
+            self.renderer = PromptRenderer(self.template)
         else:
             self.template = None
+        # Shared across every file being translated at once.
+        self.limiter = AdaptiveLimiter(
+            self.config.api.concurrency,
+            self.config.api.min_concurrency,
+            self.config.api.max_concurrency,
+            adaptive=self.config.api.adaptive,
+            latency_tolerance=self.config.api.latency_tolerance,
+        )
+        self.scheduler = ChunkScheduler(self.limiter)
+        # One connection per request the scheduler can have in flight.
+        self.http = HttpPool(self.config.api, self.limiter.maximum)
+        # Retries are handled per chunk (see RetryPolicy).
+        self.oai = openai.AsyncOpenAI(
+            api_key=self.config.api.key,
+            max_retries=0,
+            timeout=self.http.timeout,
+            http_client=self.http.client,
+        )
+        self.oai.base_url = self.config.api.host
+        self.metrics = RequestMetrics(self.config.metrics)
+        self.tokens = TokenEstimator(self.config.prompts)
+        self.glossary: Glossary | None = None
+        if self.config.prompts.glossary_filter:
+            self.glossary = Glossary(self.config.prompts.db)
+        self.memory: TranslationMemory | None = None
+        if self.config.cache.enabled:
+            self.memory = TranslationMemory(
+                pathlib.Path(self.config.cache.path), self.config.cache.max_entries
+            )
+
+    async def close(self):
+        self.scheduler.close()
+        await self.http.close()
+        stats = self.metrics.http = self.http.stats
+        if stats["requests"]:
+            logger.info(
+                f"Connections: {stats['connections']} opened for {stats['requests']} requests "
+                f"({stats['reuse_rate']:.0%} reused, {stats['connect_seconds']}s connecting)."
+            )
+        if self.config.api.adaptive:
+            logger.info(
+                f"Concurrency limit history: {[limit for _, limit in self.limiter.history]}"
+            )
+        if self.memory:
+            logger.info(f"Translation memory: {self.memory.stats}")
+            self.memory.close()
 
     @staticmethod
     def dict_chunk(data, chunk: int):
@@ -39,6 +113,48 @@ class OAICompatTranslator:
         for i in range(0, len(data), chunk):
             yield {k: data[k] for k in islice(it, chunk)}
 
+    def token_budget(self, system_prompt: str) -> int | None:
+        """Token budget for the lines of a single chunk.
+
+        Clamped so the expected completion fits `max_tokens` and the whole prompt
+        (system, history, chunk, completion) fits the context length.
+        """
+        prompts = self.config.prompts
+        if not prompts.batch_tokens:
+            return None
+        budget = prompts.batch_tokens
+        max_tokens = self.config.api.params.get("max_tokens")
+        if max_tokens:
+            # Leave some room for the json fences.
+            budget = min(budget, int(max_tokens * 0.9 / prompts.completion_ratio))
+        if prompts.context_length:
+            free = prompts.context_length - self.tokens.count(system_prompt)
+            free -= max_tokens or 0
+            # Each history pair is about one chunk plus its translation.
+            budget = min(
+                budget,
+                int(free / (1 + prompts.history * (1 + prompts.completion_ratio))),
+            )
+        return max(budget, 1)
+
+    def token_chunk(self, data: dict, budget: int, max_lines: int):
+        chunk = {}
+        used = 0
+        for k, v in data.items():
+            cost = self.tokens.count_entry(k, v)
+            if chunk and (used + cost > budget or len(chunk) >= max_lines):
+                yield chunk
+                chunk = {}
+                used = 0
+            if cost > budget:
+                logger.warning(
+                    f"{k} is estimated at {cost} tokens, over the {budget} token chunk budget."
+                )
+            chunk[k] = v
+            used += cost
+        if chunk:
+            yield chunk
+
     @staticmethod
     def wrap_json(data):
         return f"```json\n{orjson.dumps(data,option=orjson.OPT_INDENT_2).decode()}\n```"
@@ -50,7 +166,12 @@ class OAICompatTranslator:
     ):
         system_prompt = self.config.prompts.get_system_prompt(section_type)
         batch_size = self.config.prompts.batch
-        for chunk in self.dict_chunk(event_group, batch_size):
+        budget = self.token_budget(system_prompt)
+        if budget:
+            chunks = self.token_chunk(event_group, budget, batch_size)
+        else:
+            chunks = self.dict_chunk(event_group, batch_size)
+        for chunk in chunks:
             yield (
                 system_prompt,
                 chunk,
@@ -60,13 +181,68 @@ class OAICompatTranslator:
                 },
             )
 
-    async def stream_to_str(self, stream: openai.AsyncStream[openai.types.Completion]):
+    @staticmethod
+    def stream_delta(chunk) -> str:
+        return chunk.choices[0].text
+
+    @staticmethod
+    def record_usage(chunk, record: RequestRecord | None):
+        usage = getattr(chunk, "usage", None)
+        if usage and record:
+            record.prompt_tokens = usage.prompt_tokens
+            record.completion_tokens = usage.completion_tokens
+            record.estimated = False
+
+    # Chunks read past the closing fence. A stream read to the end gives its connection back to
+    # the pool, one closed early is dropped.
+    drain_chunks = 8
+
+    async def drain(self, stream: openai.AsyncStream, record: RequestRecord | None):
+        """Reads what is left of a stream whose response is already complete.
+
+        Only keeps the connection reusable. Failures here do not fail the response.
+        """
+        try:
+            for _ in range(self.drain_chunks):
+                chunk = await stream.__anext__()
+                self.record_usage(chunk, record)
+        except StopAsyncIteration:
+            pass
+        except (openai.APIError, httpx.HTTPError) as e:
+            logger.debug(f"Stream failed after the closing fence: {type(e).__name__}: {e}")
+
+    async def stream_to_str(
+        self,
+        stream: openai.AsyncStream,
+        validator: StreamValidator | None = None,
+        record: RequestRecord | None = None,
+    ):
         buffer = ""
         try:
             async for chunk in stream:
-                buffer += chunk.choices[0].text
-        except httpx.RemoteProtocolError:
+                self.record_usage(chunk, record)
+                if not chunk.choices:
+                    continue
+                delta = self.stream_delta(chunk)
+                if record and record.ttft is None and delta:
+                    record.ttft = time.monotonic() - record.started
+                buffer += delta
+                if validator is None:
+                    continue
+                state = validator.feed(delta)
+                if state == StreamState.DONE:
+                    # Closing fence is here. No need to wait for the stop string, only for the end of
+                    # a stream that is about to finish anyway.
+                    await self.drain(stream, record)
+                    return buffer[: validator.end]
+                elif state == StreamState.ABORT:
+                    raise StreamAborted(validator.reason)
+        except (httpx.RemoteProtocolError, openai.APIConnectionError):
+            # The request went through, so the server stopped sending mid-stream. Newer openai
+            # versions wrap the httpx error.
             return None
+        finally:
+            await stream.close()
         return buffer
 
     json_data_extractor = re.compile(r"(```)json(.*)\1", flags=re.DOTALL)
@@ -83,114 +259,379 @@ class OAICompatTranslator:
         }
     )
 
-    async def do_retryable_completion_text(
+    @property
+    def stream_options(self):
+        if self.config.metrics.stream_usage:
+            return {"include_usage": True}
+        return openai.NOT_GIVEN
+
+    async def request_stream(
         self,
+        create: Callable[[], Awaitable[openai.AsyncStream]],
+        expected: dict | None,
         prompt: str,
-        raw_chunk: dict,
-        stopping_strings: list[str],
-        inject: str = "",
     ):
-        tries = 10
-        key_ignore = {}
-        while tries > 0:
-            completion = await self.oai.completions.create(
+        """Runs a single streamed request and records how it went (limiter and metrics).
+
+        Args:
+            create (Callable[[], Awaitable[openai.AsyncStream]]): Starts the request.
+            expected (dict | None): Keys asked for. Validated while streaming when given.
+            prompt (str): Prompt text. Used to estimate tokens when the server sends no usage.
+        """
+        record = self.metrics.start()
+        try:
+            response = await self.stream_to_str(
+                await create(),
+                StreamValidator(list(expected), self.jp_regex) if expected else None,
+                record,
+            )
+        except StreamAborted:
+            self.metrics.finish(record, "format")
+            raise
+        except (openai.APIError, httpx.HTTPError) as e:
+            self.metrics.finish(record, self.failure_class(e))
+            self.limiter.on_error(type(e).__name__)
+            raise
+        except asyncio.CancelledError:
+            self.metrics.finish(record, "cancelled")
+            raise
+        if response is None:
+            self.metrics.finish(record, "dropped")
+            self.limiter.on_error("stream dropped")
+            return None
+        if record.estimated:
+            record.prompt_tokens = self.tokens.count(prompt)
+            record.completion_tokens = self.tokens.count(response)
+        self.metrics.finish(record)
+        self.limiter.on_success(record.latency, record.completion_tokens)
+        return response
+
+    async def request_completion_text(
+        self, prompt: str, stopping_strings: list[str], expected: dict | None = None
+    ):
+        return await self.request_stream(
+            lambda: self.oai.completions.create(
                 model=self.config.api.model,
-                prompt=prompt + inject,
+                prompt=prompt,
                 stop=stopping_strings,
                 extra_body=self.config.api.params,
                 stream=True,
-            )
-            response: str | None = await self.stream_to_str(completion)
-            if response is None:
-                logger.warning("Server Stopped sending. Retrying")
-                continue
-            response = inject + response
-            extracted_response = self.json_data_extractor.search(response)
-            if not extracted_response:
-                logger.debug(response)
-                logger.warning(
-                    f"! Can't find expected json output. Tries left: {tries}"
-                )
-                tries -= 1
-                continue
+                stream_options=self.stream_options,
+            ),
+            expected,
+            prompt,
+        )
+
+    def check_value(self, key: str, v, response_json: dict, key_ignore: dict):
+        """Checks a single translated key against its source.
+
+        Returns:
+            str | None: Reason the key failed or None if it passed.
+        """
+        if key not in response_json:
+            return "Not present in response data"
+        # Check type with original
+        tl_data = response_json[key]
+        if not isinstance(tl_data, type(v)):
+            return "does not match expected type."
+        elif isinstance(v, list) and len(tl_data) != len(v):
+            return "list length does not match expected."
+        tl_lines = tl_data if isinstance(tl_data, list) else [tl_data]
+        if any(isinstance(line, str) and self.jp_regex.search(line) for line in tl_lines):
+            return "has Japanese text."
+        # Braces check.
+        if isinstance(v, str):
+            has_braces_inorig = True if self.JP_Braces.search(v) else False
+            has_braces_intl = True if self.JP_Braces.search(tl_data) else False
+            if has_braces_inorig != has_braces_intl and key_ignore.get(key, 0) <= 2:
+                key_ignore[key] = key_ignore.setdefault(key, 0) + 1
+                return "does not match braces."
+        return None
+
+    def validate_response(self, raw_chunk: dict, response_json: dict, key_ignore: dict):
+        """Splits a response into keys that passed and the source of keys that failed.
+
+        Returns:
+            tuple[dict, dict]: (KEY -> translation, key -> source)
+        """
+        response_json = {k.upper(): v for k, v in response_json.items()}
+        extra = set(response_json) - {k.upper() for k in raw_chunk}
+        if extra:
+            logger.debug(f"Ignoring unexpected keys: {extra}")
+        passed = {}
+        failed = {}
+        for k, v in raw_chunk.items():
+            reason = self.check_value(k.upper(), v, response_json, key_ignore)
+            if reason:
+                logger.warning(f'Key: "{k.upper()}" {reason}')
+                failed[k] = v
+            else:
+                passed[k.upper()] = response_json[k.upper()]
+        return passed, failed
+
+    @staticmethod
+    def failure_class(e: Exception) -> str:
+        if isinstance(e, openai.APIStatusError) and not (
+            e.status_code in (408, 409, 429) or e.status_code >= 500
+        ):
+            return "rejected"
+        return "network"
+
+    def extract_json(self, response: str) -> str | None:
+        """Json text of a response. The completion is expected to be in a ```json fence."""
+        extracted_response = self.json_data_extractor.search(response)
+        return extracted_response.group(2) if extracted_response else None
+
+    async def do_retryable_completion_text(
+        self,
+        request: Callable[[dict], Awaitable[str | None]],
+        raw_chunk: dict,
+        retry: RetryBudget | None = None,
+    ):
+        """Requests translations for a chunk until every key is valid.
+
+        Keys that pass are kept. Only the keys that failed are sent again in a smaller follow-up request.
+
+        Args:
+            request (Callable[[dict], Awaitable[str | None]]): Requests a (sub)set of the chunk
+                and returns the response text. None if the stream dropped. The request runs
+                through `retry.run` once it is dispatched.
+            retry (RetryBudget | None): Retry budgets and deadline. `retry.reason` says why
+                the chunk was given up on.
+
+        Returns:
+            dict | None: Translations or None once the retry budget or deadline ran out.
+        """
+        if retry is None:
+            retry = RetryBudget(self.config.retry)
+        key_ignore = {}
+        pending = raw_chunk
+        translated = {}
+        while True:
+            failure = ""
             try:
-                response_json: dict = orjson.loads(extracted_response.group(2))
-                extracted: str = extracted_response.group(2)
-            except orjson.JSONDecodeError as e:
-                logger.debug(extracted_response.group(2))
-                logger.warning(f"Cannot decode response: {e}. Tries left: {tries}")
-                tries -= 1
-                continue
-            if len(list(response_json.keys())) != len(list(raw_chunk.keys())):
-                logger.debug(extracted_response.group(2))
-                logger.warning(
-                    f"Decoded keys: {len(list(response_json.keys()))} does not match expected. {len(list(raw_chunk.keys()))}. Tries left: {tries}"
-                )
-                tries -= 1
-                continue
-            if self.jp_regex.search(extracted):
-                logger.debug(extracted_response.group(2))
-                logger.warning(f"Found Japanese Text. Retrying... Tries left: {tries}")
-                continue
-            response_json = {k.upper(): v for k, v in response_json.items()}
-            all_keys_matched = True
-            for k, v in raw_chunk.items():
-                # Check for JP braces in original
-                if isinstance(v, str):
-                    has_braces_inorig = True if self.JP_Braces.search(v) else False
+                response: str | None = await request(pending)
+            except asyncio.TimeoutError:
+                retry.reason = f"deadline: no response within {self.config.retry.chunk_deadline}s"
+                logger.warning("Chunk deadline passed while waiting for a response.")
+                return None
+            except StreamAborted as e:
+                failure, detail = "format", f"Closed stream early: {e}"
+            except (openai.APIError, httpx.HTTPError) as e:
+                failure, detail = self.failure_class(e), f"{type(e).__name__}: {e}"
+            else:
+                if response is None:
+                    failure, detail = "dropped", "Server stopped sending"
                 else:
-                    has_braces_inorig = False
-
-                if k.upper() not in response_json:
-                    logger.debug(
-                        orjson.dumps(response_json, option=orjson.OPT_INDENT_2)
-                    )
-                    logger.warning(f'Key: "{k.upper()}" Not present in response data')
-                    all_keys_matched = False
+                    extracted_response = self.extract_json(response)
+                    if extracted_response is None:
+                        logger.debug(response)
+                        failure, detail = "format", "Can't find expected json output"
+            if not failure:
+                try:
+                    response_json = orjson.loads(extracted_response)
+                except orjson.JSONDecodeError as e:
+                    logger.debug(extracted_response)
+                    failure, detail = "format", f"Cannot decode response: {e}"
+                else:
+                    if not isinstance(response_json, dict):
+                        failure, detail = "format", "Response is not a json object"
+            if not failure:
+                passed, failed = self.validate_response(
+                    pending, response_json, key_ignore
+                )
+                translated.update(passed)
+                if not failed:
                     break
+                logger.debug(extracted_response)
+                logger.warning(f"Re-requesting {len(failed)} of {len(pending)} keys.")
+                pending = failed
+                self.metrics.retry("partial")
+                if passed:
+                    # Progress was made. Only the deadline applies.
+                    if not retry.remaining:
+                        retry.fail("validation", "Deadline passed while re-requesting")
+                        return None
+                    continue
+                # No progress at all.
+                failure, detail = "validation", f"{len(failed)} keys failed"
+            self.metrics.retry(failure)
+            if not retry.fail(failure, detail):
+                return None
+            delay = retry.backoff(failure)
+            logger.warning(
+                f"{detail}. Retrying{f' in {delay:.1f}s' if delay else ''} "
+                f"({retry.left(failure)} {failure} retries left)"
+            )
+            if delay:
+                await asyncio.sleep(delay)
+        # Apply post-fixes
+        for k, v in translated.items():
+            if isinstance(v, str):
+                translated[k] = v.translate(self.post_fix)
+        # Same key order as the source.
+        return {k.upper(): translated[k.upper()] for k in raw_chunk}
 
-                # Check type with original
-                tl_data = response_json[k.upper()]
-                if not isinstance(tl_data, type(v)):
-                    logger.debug(
-                        orjson.dumps(response_json, option=orjson.OPT_INDENT_2)
-                    )
-                    logger.warning(f'Key: "{k.upper()}" does not match expected type.')
-                    all_keys_matched = False
-                    break
-                elif (
-                    isinstance(v, list)
-                    and isinstance(tl_data, list)
-                    and len(tl_data) != len(v)
-                ):
-                    logger.debug(
-                        orjson.dumps(response_json, option=orjson.OPT_INDENT_2)
+    @staticmethod
+    def context_lines(lines: list) -> str:
+        return "\n".join(
+            " / ".join(line) if isinstance(line, list) else line for line in lines
+        )
+
+    def chunk_context(self, chunks: list[dict], chunk_idx: int) -> str:
+        """Source lines of the neighbouring chunks, used instead of history in parallel mode."""
+        window = self.config.prompts.context_lines
+        if window <= 0:
+            return ""
+        before = [
+            v for chunk in chunks[:chunk_idx] for v in chunk.values()
+        ][-window:]
+        after = [
+            v for chunk in chunks[chunk_idx + 1 :] for v in chunk.values()
+        ][:window]
+        context = ""
+        if before:
+            context += f"Previous lines (for context only, do not translate):\n```\n{self.context_lines(before)}\n```\n"
+        if after:
+            context += f"Following lines (for context only, do not translate):\n```\n{self.context_lines(after)}\n```\n"
+        return context
+
+    def user_message(self, raw_chunk: dict, context: str = ""):
+        # Per-chunk parts go into the user message so the system prompt stays a shared prefix.
+        terms = ""
+        if self.glossary:
+            found = self.glossary.terms_for(raw_chunk)
+            if found:
+                terms = f"Common Terms: {self.config.prompts.format_db(found)}\n"
+        return {"role": "user", "content": terms + context + self.wrap_json(raw_chunk)}
+
+    async def request_chunk(
+        self,
+        build_messages: Callable[[dict], list[dict[str, str]]],
+        raw_chunk: dict,
+        retry: RetryBudget,
+    ) -> dict | None:
+        """Translates the lines of a chunk through text completions.
+
+        Args:
+            build_messages (Callable[[dict], list[dict[str, str]]]): Builds the chat messages
+                for a (sub)set of the chunk.
+
+        Returns:
+            dict | None: Translations or None when it was given up on.
+        """
+        if not self.renderer:
+            raise NotImplementedError()
+        renderer = self.renderer
+        # HACK: adding "```json" is pretty rough but like... not too sure what else to do lmao
+        append_completion = f"Translated {self.config.prompts.dest_lang}:\n```json"
+
+        async def request(pending: dict):
+            prompt = renderer.render(build_messages(pending)) + append_completion
+            response = await self.scheduler.submit(
+                lambda: retry.run(
+                    lambda: self.request_completion_text(
+                        prompt, renderer.stop_strings, pending
                     )
-                    logger.warning("List length does not match expected.")
-                    all_keys_matched = False
-                    break
-                # Braces check.
-                if isinstance(v, str):
-                    has_braces_intl = True if self.JP_Braces.search(tl_data) else False
-                else:
-                    has_braces_intl = False
-                if (
-                    has_braces_inorig != has_braces_intl
-                    and key_ignore.get(k.upper(), 0) <= 2
-                ):
-                    key_ignore[k.upper()] = key_ignore.setdefault(k.upper(), 0) + 1
-                    logger.warning(f'Key: "{k.upper()}" does not match braces.')
-                    all_keys_matched = False
-                    break
-            if not all_keys_matched:
-                # tries -= 1
-                continue
-            # Apply post-fixes
-            for k, v in response_json.items():
-                if isinstance(v, str):
-                    response_json[k] = v.translate(self.post_fix)
+                )
+            )
+            return None if response is None else append_completion + response
+
+        return await self.do_retryable_completion_text(request, raw_chunk, retry)
+
+    async def do_chunk(
+        self,
+        container: TranslationContainer,
+        scope: str | None,
+        chunk_idx: int,
+        system: str,
+        raw_chunk: dict,
+        context: str,
+        history: collections.deque | None,
+    ) -> dict | None:
+        """Translates a single chunk of a container.
+
+        Args:
+            history (collections.deque | None): Previous user/assistant pairs.
+                None for history-free (parallel) chunks.
+
+        Returns:
+            dict | None: Translations for the whole chunk or None when it was given up on.
+        """
+        request_labels.set(
+            (container.origin[0] if container.origin else "", container.tl_type)
+        )
+        chunk = self.user_message(raw_chunk, context)
+        if history is None:
+            history = collections.deque(maxlen=2)
+        replayed = {}
+        if self.journal:
+            replayed, missing = self.journal.get_lines(container.tl_type, raw_chunk)
+            if not missing:
+                logger.debug(f"Chunk replayed from journal: {raw_chunk}")
+                history.append(chunk)
+                history.append(
+                    {"role": "assistant", "content": self.wrap_json(replayed)}
+                )
+                return replayed
+            if replayed:
+                raw_chunk = missing
+                chunk = self.user_message(missing, context)
+        # Lines that were not in the journal.
+        new_chunk = raw_chunk
+        cached = {}
+        if self.memory and scope:
+            cached, missing = self.memory.lookup_chunk(scope, raw_chunk)
+            if not missing:
+                logger.debug(f"Chunk fully cached: {raw_chunk}")
+                # Still keep it as history for the next chunks.
+                history.append(chunk)
+                history.append({"role": "assistant", "content": self.wrap_json(cached)})
+                return {**replayed, **cached}
+            if cached:
+                raw_chunk = missing
+                chunk = self.user_message(missing, context)
+        logger.debug(f"Working on chunk: {raw_chunk}")
+        previous = list(history)
+        history.append(chunk)
 
-            return response_json
+        def build_messages(pending: dict) -> list[dict[str, str]]:
+            messages = [
+                {"role": "system", "content": system},
+                *previous,
+                chunk if pending is raw_chunk else self.user_message(pending, context),
+            ]
+            logger.debug(messages)
+            return messages
+
+        retry = RetryBudget(self.config.retry)
+        response_json = await self.request_chunk(build_messages, raw_chunk, retry)
+        if response_json is None:
+            logger.warning(f"Gave up with batch chunk ({retry.reason}): {raw_chunk}.")
+            self.metrics.give_up()
+            if self.dead_letter:
+                self.dead_letter.record(
+                    container.origin,
+                    chunk_idx,
+                    container.tl_type,
+                    retry.reason,
+                    dict(retry.failures),
+                    raw_chunk,
+                )
+            # No reply to pair it with.
+            history.pop()
+            # Keep whatever was replayed or cached.
+            return {**replayed, **cached} or None
+        if self.memory and scope:
+            self.memory.store_chunk(scope, raw_chunk, response_json)
+        if self.journal:
+            self.journal.record_lines(
+                container.tl_type, new_chunk, {**cached, **response_json}
+            )
+        translated = {**replayed, **cached, **response_json}
+        history.append({"role": "assistant", "content": self.wrap_json(response_json)})
+        logger.debug(f"Translated chunk: {response_json}")
+        return translated
 
     async def do_container(
         self, container: TranslationContainer
@@ -198,77 +639,66 @@ class OAICompatTranslator:
         section_type = container.tl_type
         section_data = container.data
 
-        queue = collections.deque(maxlen=self.config.prompts.history * 2)
-        for system, raw_chunk, chunk in self.format_messages(
-            section_type, section_data
-        ):
-            logger.debug(f"Working on chunk: {raw_chunk}")
-            if self.template:
-                queue.append(chunk)
-                vars = {
-                    "add_generation_prompt": True,
-                    "stop_strings": [],
-                    "messages": [{"role": "system", "content": system}, *queue],
-                }
-                logger.debug(vars)
-
-                template_module = self.template.make_module(vars)
-                append_completion = (
-                    f"Translated {self.config.prompts.dest_lang}:\n```json"
-                )
-                response_json = await self.do_retryable_completion_text(
-                    # HACK: adding "```json" is pretty rough but like... not too sure what else to do lmao
-                    str(template_module),
-                    raw_chunk,
-                    template_module.stop_strings,  # type: ignore
-                    inject=append_completion,
-                )
-                if response_json is None:
-                    logger.warning(f"Gave up with batch container ID: {idx}.")
-                    break
-                if container.translated is None:
-                    container.translated = {}
-                if response_json:
-                    container.translated.update(response_json)
-                    queue.append(
-                        {
-                            "role": "assistant",
-                            "content": self.wrap_json(response_json),
-                        }
+        scope = None
+        if self.memory:
+            system = self.config.prompts.get_system_prompt(section_type)
+            if self.glossary:
+                # The db is no longer part of the system prompt but still changes translations.
+                system += self.config.prompts.get_text_db
+            scope = self.memory.make_scope(self.config.api.model, section_type, system)
+        if container.translated is None:
+            container.translated = {}
+
+        messages = list(self.format_messages(section_type, section_data))
+        if section_type in self.config.prompts.parallel_modes:
+            # History-free: every chunk is sent at once with the neighbouring source lines as context.
+            raw_chunks = [raw_chunk for _, raw_chunk, _ in messages]
+            results = await asyncio.gather(
+                *[
+                    self.do_chunk(
+                        container,
+                        scope,
+                        chunk_idx,
+                        system,
+                        raw_chunk,
+                        self.chunk_context(raw_chunks, chunk_idx),
+                        None,
                     )
-                    logger.debug(f"Translated chunk: {response_json}")
-            else:
-                raise NotImplementedError()
+                    for chunk_idx, (system, raw_chunk, _) in enumerate(messages)
+                ]
+            )
+            for result in results:
+                if result:
+                    container.translated.update(result)
+            return container
+
+        queue = collections.deque(maxlen=self.config.prompts.history * 2)
+        for chunk_idx, (system, raw_chunk, _) in enumerate(messages):
+            result = await self.do_chunk(
+                container, scope, chunk_idx, system, raw_chunk, "", queue
+            )
+            if result is None:
+                # Only this chunk is in the dead letter. The next ones start without history
+                # rather than continuing a conversation with a gap in it.
+                queue.clear()
+                continue
+            container.translated.update(result)
         return container
 
     async def translate_containers_batched(
         self, to_tl_containers: list[TranslationContainer | None]
     ) -> list[TranslationContainer | None]:
-        container_queue = asyncio.Queue()
-        responses = []
+        # Every container is driven at once. The scheduler caps the actual requests in-flight.
+        async def container_worker(idx: int, container: TranslationContainer):
+            to_tl_containers[idx] = await self.do_container(container)
 
-        async def container_worker():
-            while container_queue.qsize() > 0:
-                try:
-                    data: tuple[
-                        int, TranslationContainer
-                    ] = container_queue.get_nowait()
-                except asyncio.QueueEmpty:
-                    break
-                index, container = data
-                container = await self.do_container(container)
-                responses.append((index, container))
-
-        loop = asyncio.get_running_loop()
-        workers = [loop.create_task(container_worker()) for _ in range(5)]
-        for idx, container in enumerate(to_tl_containers):
-            if not container:
-                continue
-            # print(container)
-            await container_queue.put((idx, container))
-        await asyncio.gather(*workers)
-        for idx, container in responses:
-            to_tl_containers[idx] = container
+        await asyncio.gather(
+            *[
+                container_worker(idx, container)
+                for idx, container in enumerate(to_tl_containers)
+                if container
+            ]
+        )
         return to_tl_containers
 
     async def translate_containers(
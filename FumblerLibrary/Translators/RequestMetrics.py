@@ -0,0 +1,253 @@
+import collections
+import contextvars
+import pathlib
+import time
+from typing import Any, Iterable
+
+import orjson
+import pydantic
+from loguru import logger
+
+from FumblerLibrary.FumblerModels import MetricsConfig
+
+# (file, mode) the current request is for. Set per chunk, carried into the scheduler's workers.
+request_labels: contextvars.ContextVar[tuple[str, str]] = contextvars.ContextVar(
+    "request_labels", default=("", "")
+)
+# Seconds the current request waited in the scheduler queue.
+queue_wait: contextvars.ContextVar[float] = contextvars.ContextVar(
+    "queue_wait", default=0.0
+)
+
+
+class RequestRecord(pydantic.BaseModel):
+    file: str
+    mode: str
+    # "ok" or the failure class (network, rejected, dropped, format).
+    outcome: str = "ok"
+    started: float
+    queue_wait: float = 0.0
+    ttft: float | None = None
+    latency: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Tokens were estimated locally since the server did not report usage.
+    estimated: bool = True
+
+
+def quantiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def at(q: float):
+        return round(values[min(int(q * len(values)), len(values) - 1)], 4)
+
+    return {
+        "mean": round(sum(values) / len(values), 4),
+        "p50": at(0.5),
+        "p95": at(0.95),
+        "max": round(values[-1], 4),
+    }
+
+
+class RequestMetrics:
+    """Collects per-request metrics and writes the run report.
+
+    Every completion request is recorded with its time to first token, latency, queue wait and
+    token counts (`usage` from the server, estimated otherwise). Retries are recorded by failure
+    class. The report breaks everything down per file and per mode.
+    """
+
+    def __init__(self, config: MetricsConfig) -> None:
+        self.config = config
+        self.records: list[RequestRecord] = []
+        self.retries: collections.Counter[tuple[str, str, str]] = collections.Counter()
+        self.gave_up: collections.Counter[tuple[str, str]] = collections.Counter()
+        self.started = time.monotonic()
+        # Connection reuse of the http pool, set when the translator closes.
+        self.http: dict[str, Any] = {}
+
+    def start(self) -> RequestRecord:
+        file, mode = request_labels.get()
+        return RequestRecord(
+            file=file, mode=mode, started=time.monotonic(), queue_wait=queue_wait.get()
+        )
+
+    def finish(self, record: RequestRecord, outcome: str = "ok"):
+        record.outcome = outcome
+        record.latency = time.monotonic() - record.started
+        self.records.append(record)
+
+    def retry(self, failure: str):
+        self.retries[(*request_labels.get(), failure)] += 1
+
+    def give_up(self):
+        self.gave_up[request_labels.get()] += 1
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return round(
+            (
+                prompt_tokens * self.config.prompt_price
+                + completion_tokens * self.config.completion_price
+            )
+            / 1_000_000,
+            6,
+        )
+
+    def summarize(
+        self,
+        records: list[RequestRecord],
+        retries: Iterable[tuple[str, int]],
+        gave_up: int,
+    ) -> dict[str, Any]:
+        outcomes = collections.Counter(record.outcome for record in records)
+        retry_counts: collections.Counter[str] = collections.Counter()
+        for failure, count in retries:
+            retry_counts[failure] += count
+        prompt_tokens = sum(record.prompt_tokens for record in records)
+        completion_tokens = sum(record.completion_tokens for record in records)
+        return {
+            "requests": len(records),
+            "outcomes": dict(outcomes),
+            "retries": dict(retry_counts),
+            "gave_up_chunks": gave_up,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "estimated_token_requests": sum(record.estimated for record in records),
+            "cost": self.cost(prompt_tokens, completion_tokens),
+            "latency": quantiles([record.latency for record in records]),
+            "ttft": quantiles(
+                [record.ttft for record in records if record.ttft is not None]
+            ),
+            "queue_wait": quantiles([record.queue_wait for record in records]),
+        }
+
+    def breakdown(self, index: int) -> dict[str, dict[str, Any]]:
+        groups: dict[str, list[RequestRecord]] = collections.defaultdict(list)
+        for record in self.records:
+            groups[(record.file, record.mode)[index]].append(record)
+        for labels in list(self.retries) + list(self.gave_up):
+            groups.setdefault(labels[index], [])
+        return {
+            name: self.summarize(
+                records,
+                [(k[2], v) for k, v in self.retries.items() if k[index] == name],
+                sum(v for k, v in self.gave_up.items() if k[index] == name),
+            )
+            for name, records in sorted(groups.items())
+        }
+
+    def report(self) -> dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        total = self.summarize(
+            self.records,
+            [(k[2], v) for k, v in self.retries.items()],
+            sum(self.gave_up.values()),
+        )
+        total["seconds"] = round(elapsed, 3)
+        total["requests_per_s"] = round(len(self.records) / elapsed, 3) if elapsed else 0
+        if self.http:
+            total["http"] = self.http
+        return {"total": total, "files": self.breakdown(0), "modes": self.breakdown(1)}
+
+    @staticmethod
+    def prom_labels(**labels: str) -> str:
+        def escape(value: str):
+            return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+    def prometheus(self) -> str:
+        lines = []
+
+        def metric(name: str, kind: str, help: str):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        requests = collections.Counter(
+            (record.file, record.mode, record.outcome) for record in self.records
+        )
+        metric("fumbler_requests_total", "counter", "Completion requests.")
+        for (file, mode, outcome), count in sorted(requests.items()):
+            lines.append(
+                f"fumbler_requests_total{self.prom_labels(file=file, mode=mode, outcome=outcome)} {count}"
+            )
+        metric("fumbler_retries_total", "counter", "Retries per failure class.")
+        for (file, mode, failure), count in sorted(self.retries.items()):
+            lines.append(
+                f"fumbler_retries_total{self.prom_labels(file=file, mode=mode, failure=failure)} {count}"
+            )
+        metric("fumbler_gave_up_chunks_total", "counter", "Chunks given up on.")
+        for (file, mode), count in sorted(self.gave_up.items()):
+            lines.append(
+                f"fumbler_gave_up_chunks_total{self.prom_labels(file=file, mode=mode)} {count}"
+            )
+        tokens: collections.Counter[tuple[str, str, str]] = collections.Counter()
+        for record in self.records:
+            tokens[(record.file, record.mode, "prompt")] += record.prompt_tokens
+            tokens[(record.file, record.mode, "completion")] += record.completion_tokens
+        metric("fumbler_tokens_total", "counter", "Prompt and completion tokens.")
+        for (file, mode, kind), count in sorted(tokens.items()):
+            lines.append(
+                f"fumbler_tokens_total{self.prom_labels(file=file, mode=mode, kind=kind)} {count}"
+            )
+        by_mode: dict[str, list[RequestRecord]] = collections.defaultdict(list)
+        for record in self.records:
+            by_mode[record.mode].append(record)
+        for name, help, values_of in (
+            (
+                "fumbler_request_latency_seconds",
+                "Request latency.",
+                lambda records: [r.latency for r in records],
+            ),
+            (
+                "fumbler_request_ttft_seconds",
+                "Time to first token.",
+                lambda records: [r.ttft for r in records if r.ttft is not None],
+            ),
+            (
+                "fumbler_request_queue_wait_seconds",
+                "Time spent waiting in the scheduler queue.",
+                lambda records: [r.queue_wait for r in records],
+            ),
+        ):
+            metric(name, "summary", help)
+            for mode, records in sorted(by_mode.items()):
+                values = values_of(records)
+                summary = quantiles(values)
+                for quantile, key in (("0.5", "p50"), ("0.95", "p95")):
+                    if key in summary:
+                        lines.append(
+                            f"{name}{self.prom_labels(mode=mode, quantile=quantile)} {summary[key]}"
+                        )
+                lines.append(f"{name}_sum{self.prom_labels(mode=mode)} {sum(values)}")
+                lines.append(f"{name}_count{self.prom_labels(mode=mode)} {len(values)}")
+        if self.http:
+            metric("fumbler_http_connections_total", "counter", "Connections opened.")
+            lines.append(f"fumbler_http_connections_total {self.http['connections']}")
+            metric(
+                "fumbler_http_reused_requests_total",
+                "counter",
+                "Requests sent over an already open connection.",
+            )
+            lines.append(f"fumbler_http_reused_requests_total {self.http['reused']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, output_folder: pathlib.Path):
+        if not self.records:
+            return
+        report = self.report()
+        path = output_folder / "rpgmaker_metrics.json"
+        path.write_bytes(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+        if self.config.prometheus:
+            (output_folder / "rpgmaker_metrics.prom").write_text(
+                self.prometheus(), encoding="utf-8"
+            )
+        total = report["total"]
+        logger.info(
+            f"Requests: {total['requests']} ({total['requests_per_s']}/s), "
+            f"tokens: {total['prompt_tokens']} prompt / {total['completion_tokens']} completion, "
+            f"latency p50 {total['latency'].get('p50')}s, ttft p50 {total['ttft'].get('p50')}s. "
+            f"Report: {path}"
+        )
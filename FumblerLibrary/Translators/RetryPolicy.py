@@ -0,0 +1,139 @@
+import asyncio
+import collections
+import os
+import pathlib
+import random
+import time
+from typing import Any, Awaitable, Callable
+
+import orjson
+from loguru import logger
+
+from FumblerLibrary.FumblerModels import RETRY_BUDGETS, RetryConfig
+
+# Failures that come from the endpoint itself. These are backed off, the others
+# (bad output from the model) are retried right away.
+ENDPOINT_FAILURES = {"network", "dropped", "rejected"}
+
+
+class RetryBudget:
+    """Retry state for a single chunk.
+
+    Each failure class has its own budget so that, for example, a flaky connection does not
+    use up the retries meant for badly formatted responses. The whole chunk also has a wall-clock
+    deadline. Once either runs out, the chunk is given up on.
+
+    The deadline starts when the chunk's first request is dispatched by the scheduler, so time
+    spent queued behind other chunks does not count.
+    """
+
+    def __init__(self, config: RetryConfig) -> None:
+        self.config = config
+        self.failures: collections.Counter[str] = collections.Counter()
+        self.deadline: float | None = None
+        self.reason = ""
+
+    @property
+    def remaining(self) -> float:
+        if self.deadline is None:
+            return self.config.chunk_deadline
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    async def run(self, job: Callable[[], Awaitable[Any]]) -> Any:
+        """Runs a dispatched request within the deadline, starting it on the first request.
+
+        Raises:
+            asyncio.TimeoutError: The deadline passed.
+        """
+        if self.deadline is None:
+            self.deadline = time.monotonic() + self.config.chunk_deadline
+        return await asyncio.wait_for(job(), self.remaining)
+
+    def left(self, failure: str) -> int:
+        budget = self.config.budgets.get(failure, RETRY_BUDGETS.get(failure, 1))
+        return max(budget - self.failures[failure], 0)
+
+    def fail(self, failure: str, detail: str = "") -> bool:
+        """Records a failure.
+
+        Args:
+            failure (str): Failure class. One of the `retry.budgets` keys.
+            detail (str): What happened. Kept as the reason if this was the last try.
+
+        Returns:
+            bool: True if the chunk may be retried.
+        """
+        self.failures[failure] += 1
+        self.reason = f"{failure}: {detail}" if detail else failure
+        if not self.left(failure):
+            logger.warning(f"Out of retries for {failure} failures. ({detail})")
+            return False
+        if not self.remaining:
+            self.reason = f"deadline: {self.reason}"
+            logger.warning(f"Chunk deadline of {self.config.chunk_deadline}s passed.")
+            return False
+        return True
+
+    def backoff(self, failure: str) -> float:
+        """Delay before the next try. Exponential with full jitter, capped to the deadline."""
+        if failure not in ENDPOINT_FAILURES:
+            return 0.0
+        cap = min(
+            self.config.max_delay,
+            self.config.base_delay * 2 ** (self.failures[failure] - 1),
+        )
+        return min(random.uniform(0, cap), self.remaining)
+
+
+class DeadLetter:
+    """Append-only file of chunks that were given up on.
+
+    Each line has the file, container and chunk it came from, why it failed and the source lines,
+    so the run can finish and the failed chunks can be looked at (or retried) afterwards.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self.count = 0
+        if path.exists():
+            path.unlink()
+        self.fp = None
+
+    def record(
+        self,
+        origin: tuple[str, int] | None,
+        chunk: int,
+        mode: str,
+        reason: str,
+        failures: dict[str, int],
+        raw_chunk: dict[str, Any],
+    ):
+        if self.fp is None:
+            # Only create the file once something actually failed.
+            self.fp = open(self.path, "ab")
+        file, container = origin if origin else (None, None)
+        self.fp.write(
+            orjson.dumps(
+                {
+                    "file": file,
+                    "container": container,
+                    "chunk": chunk,
+                    "mode": mode,
+                    "reason": reason,
+                    "failures": failures,
+                    "data": raw_chunk,
+                }
+            )
+            + b"\n"
+        )
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+        self.count += 1
+
+    def close(self):
+        if self.fp is not None and not self.fp.closed:
+            self.fp.close()
+        if self.count:
+            logger.warning(
+                f"{self.count} chunks could not be translated. See {self.path}"
+            )
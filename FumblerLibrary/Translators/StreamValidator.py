@@ -0,0 +1,152 @@
+import enum
+import re
+from typing import Any
+
+import orjson
+
+OPENING_FENCE = "```json"
+
+class StreamState(enum.Enum):
+    CONTINUE = 0
+    DONE = 1
+    ABORT = 2
+
+
+class StreamAborted(Exception):
+    """Raised when a streamed response was closed early because it cannot be valid."""
+
+
+class StreamValidator:
+    """Incremental validator for a streamed ```json response.
+
+    Fed the streamed deltas (after the opening fence, a leading ```json fence is skipped) and
+    checks each top-level key and value as soon as it completes. The stream can then be closed
+    as soon as:
+
+    - The response drifts outside the json object (text before the opening brace).
+    - A key that was not asked for shows up.
+    - Most values come back still in Japanese (the model is echoing the input).
+    - The closing fence after the json object arrives (done, no need to wait for the stop string).
+    """
+
+    def __init__(self, expected_keys: list[str], jp_regex: re.Pattern) -> None:
+        self.expected = {k.upper() for k in expected_keys}
+        self.jp_regex = jp_regex
+        self.buffer = ""
+        self.pos = 0
+        self.started = False
+        # An opening fence was skipped.
+        self.fenced = False
+        self.closed_at = -1
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.token_start = -1
+        self.expect_key = True
+        self.value_start = -1
+        self.key: str | None = None
+        self.japanese_values = 0
+        self.reason = ""
+        # End of the closing fence once DONE.
+        self.end = -1
+
+    def abort(self, reason: str):
+        self.reason = reason
+        return StreamState.ABORT
+
+    def check_key(self, token: str):
+        try:
+            key = orjson.loads(token)
+        except orjson.JSONDecodeError:
+            return self.abort(f"Cannot decode key {token}")
+        if not isinstance(key, str) or key.upper() not in self.expected:
+            return self.abort(f"Unexpected key {token}")
+        self.key = key
+        return StreamState.CONTINUE
+
+    def check_value(self, token: str):
+        try:
+            value: Any = orjson.loads(token)
+        except orjson.JSONDecodeError:
+            return self.abort(f"Cannot decode value for {self.key}")
+        lines = value if isinstance(value, list) else [value]
+        if any(isinstance(line, str) and self.jp_regex.search(line) for line in lines):
+            self.japanese_values += 1
+            # A single stray line is left to the per key re-request.
+            if self.japanese_values > max(1, len(self.expected) // 2):
+                return self.abort("Response is echoing Japanese")
+        return StreamState.CONTINUE
+
+    def feed(self, delta: str) -> StreamState:
+        self.buffer += delta
+        text = self.buffer
+        while self.pos < len(text):
+            ch = text[self.pos]
+            if self.closed_at >= 0:
+                # After the object, the closing fence means we are done.
+                fence = text.find("```", self.closed_at)
+                if fence >= 0:
+                    self.end = fence + 3
+                    return StreamState.DONE
+                self.pos = len(text)
+                break
+            if not self.started:
+                if ch == "`" and not self.fenced:
+                    # Servers ignoring the structured output params still send a fence.
+                    rest = text[self.pos :]
+                    if len(rest) < len(OPENING_FENCE) and OPENING_FENCE.startswith(rest):
+                        break
+                    if rest.startswith("```"):
+                        self.fenced = True
+                        self.pos += (
+                            len(OPENING_FENCE) if rest.startswith(OPENING_FENCE) else 3
+                        )
+                        continue
+                if ch == "{":
+                    self.started = True
+                    self.depth = 1
+                elif not ch.isspace():
+                    return self.abort("Text outside of the json object")
+                self.pos += 1
+                continue
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        token = text[self.token_start : self.pos + 1]
+                        if self.expect_key:
+                            state = self.check_key(token)
+                        else:
+                            state = self.check_value(token)
+                            self.value_start = -1
+                        if state != StreamState.CONTINUE:
+                            return state
+                self.pos += 1
+                continue
+            if ch == '"':
+                self.in_string = True
+                if self.depth == 1:
+                    self.token_start = self.pos
+            elif ch == ":" and self.depth == 1:
+                self.expect_key = False
+            elif ch == "," and self.depth == 1:
+                self.expect_key = True
+            elif ch in "[{":
+                if self.depth == 1:
+                    self.value_start = self.pos
+                self.depth += 1
+            elif ch in "]}":
+                self.depth -= 1
+                if self.depth == 1 and self.value_start >= 0:
+                    state = self.check_value(text[self.value_start : self.pos + 1])
+                    self.value_start = -1
+                    if state != StreamState.CONTINUE:
+                        return state
+                elif self.depth == 0:
+                    self.closed_at = self.pos + 1
+            self.pos += 1
+        return StreamState.CONTINUE
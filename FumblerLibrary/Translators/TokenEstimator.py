@@ -0,0 +1,51 @@
+import re
+from typing import Any
+
+import orjson
+from loguru import logger
+
+from FumblerLibrary.FumblerModels import PromptConfig
+
+CJK_regex = re.compile(r"[　-ヿ㐀-䶿一-鿿＀-￯]")
+
+
+class TokenEstimator:
+    """Estimates token counts for batching.
+
+    Uses a local tokenizer (`tokenizers` package, tokenizer.json or a hub name) when
+    `prompts.tokenizer` is set. Otherwise falls back to a chars-per-token heuristic that
+    counts Japanese/CJK characters separately from everything else.
+    """
+
+    def __init__(self, prompts: PromptConfig) -> None:
+        self.prompts = prompts
+        self.tokenizer = None
+        if prompts.tokenizer:
+            try:
+                from tokenizers import Tokenizer
+
+                if prompts.tokenizer.endswith(".json"):
+                    self.tokenizer = Tokenizer.from_file(prompts.tokenizer)
+                else:
+                    self.tokenizer = Tokenizer.from_pretrained(prompts.tokenizer)
+            except ImportError:
+                logger.warning(
+                    "prompts.tokenizer is set but `tokenizers` is not installed. Using the heuristic."
+                )
+            except Exception as e:
+                logger.warning(f"Cannot load tokenizer {prompts.tokenizer}: {e}")
+
+    def count(self, text: str) -> int:
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        cjk = len(CJK_regex.findall(text))
+        return int(
+            cjk / self.prompts.cjk_chars_per_token
+            + (len(text) - cjk) / self.prompts.chars_per_token
+        ) + 1
+
+    def count_entry(self, key: str, value: Any) -> int:
+        # Roughly how the entry looks in the indented json sent to the model.
+        return self.count(
+            orjson.dumps({key: value}, option=orjson.OPT_INDENT_2).decode()
+        )
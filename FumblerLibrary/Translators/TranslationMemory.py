@@ -0,0 +1,149 @@
+import hashlib
+import pathlib
+import sqlite3
+import time
+from typing import Any
+
+import orjson
+from loguru import logger
+
+
+class TranslationMemory:
+    """On-disk (SQLite) translation memory.
+
+    Lines are stored per "scope", which is a hash of the model, prompt mode and
+    system prompt. Changing any of those will not reuse old translations.
+    """
+
+    def __init__(self, path: pathlib.Path, max_entries: int = 200_000) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS memory ("
+            "scope TEXT NOT NULL, "
+            "source BLOB NOT NULL, "
+            "translation BLOB NOT NULL, "
+            "last_used REAL NOT NULL, "
+            "PRIMARY KEY (scope, source))"
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS memory_last_used ON memory (last_used)"
+        )
+        self.db.commit()
+        self.entries: int = self.db.execute("SELECT COUNT(*) FROM memory").fetchone()[
+            0
+        ]
+        logger.info(f"Translation memory: {self.entries} entries loaded from {path}")
+
+    @staticmethod
+    def make_scope(model: str, mode: str, system_prompt: str) -> str:
+        hasher = hashlib.sha256()
+        for part in (model, mode, system_prompt):
+            hasher.update(part.encode("utf-8"))
+            hasher.update(b"\0")
+        return hasher.hexdigest()
+
+    @staticmethod
+    def encode(value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    def lookup_chunk(self, scope: str, chunk: dict[str, Any]):
+        """Split a chunk into cached translations and lines that still need work.
+
+        Args:
+            scope (str): Scope from make_scope.
+            chunk (dict[str, Any]): L_XX -> source mapping.
+
+        Returns:
+            tuple[dict, dict]: (cached key -> translation, missing key -> source)
+        """
+        cached: dict[str, Any] = {}
+        missing: dict[str, Any] = {}
+        now = time.time()
+        for k, v in chunk.items():
+            row = self.db.execute(
+                "SELECT translation FROM memory WHERE scope = ? AND source = ?",
+                (scope, self.encode(v)),
+            ).fetchone()
+            if row is None:
+                missing[k] = v
+                continue
+            translation = orjson.loads(row[0])
+            # Value shape must still line up with the source.
+            if not isinstance(translation, type(v)) or (
+                isinstance(v, list) and len(v) != len(translation)
+            ):
+                missing[k] = v
+                continue
+            cached[k.upper()] = translation
+        if cached:
+            self.db.executemany(
+                "UPDATE memory SET last_used = ? WHERE scope = ? AND source = ?",
+                [(now, scope, self.encode(chunk[k])) for k in chunk if k not in missing],
+            )
+            self.db.commit()
+        self.hits += len(cached)
+        self.misses += len(missing)
+        return cached, missing
+
+    def store_chunk(
+        self, scope: str, raw_chunk: dict[str, Any], translated: dict[str, Any]
+    ):
+        now = time.time()
+        rows = [
+            (scope, self.encode(v), self.encode(translated[k.upper()]), now)
+            for k, v in raw_chunk.items()
+            if k.upper() in translated
+        ]
+        if not rows:
+            return
+        before = self.db.total_changes
+        self.db.executemany(
+            "INSERT OR REPLACE INTO memory (scope, source, translation, last_used) "
+            "VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        self.db.commit()
+        # INSERT OR REPLACE counts a replaced row as a change too. Close enough for a bound.
+        self.entries += self.db.total_changes - before
+        if self.entries > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        # Trim to 90% so we don't evict on every single insert.
+        target = int(self.max_entries * 0.9)
+        self.entries = self.db.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+        overflow = self.entries - target
+        if overflow <= 0:
+            return
+        self.db.execute(
+            "DELETE FROM memory WHERE rowid IN "
+            "(SELECT rowid FROM memory ORDER BY last_used ASC LIMIT ?)",
+            (overflow,),
+        )
+        self.db.commit()
+        self.entries -= overflow
+        self.evicted += overflow
+        logger.info(f"Translation memory: evicted {overflow} old entries.")
+
+    @property
+    def stats(self):
+        total = self.hits + self.misses
+        self.entries = self.db.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": self.entries,
+            "evicted": self.evicted,
+        }
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
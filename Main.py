@@ -1,5 +1,6 @@
 import asyncio
 import pathlib
+from typing import Annotated
 
 import orjson
 import tomli
@@ -22,18 +23,56 @@ def prepare_config(root_dir: pathlib.Path):
     config.prompts.samples = orjson.loads(
         (root_dir / "sample.json").read_text(encoding="utf-8")
     )
+    cache_path = pathlib.Path(config.cache.path)
+    if not cache_path.is_absolute():
+        config.cache.path = str(root_dir / cache_path)
     return config
 
 
 @app.command(name="rpgmaker")
-def rpgmaker():
+def rpgmaker(
+    resume: Annotated[
+        bool,
+        typer.Option(
+            "--resume",
+            help="Replay the journal from an interrupted run and only send missing lines.",
+        ),
+    ] = False,
+    profile: Annotated[
+        bool,
+        typer.Option(
+            "--profile",
+            help="Profile each stage per file (cProfile). Written to outputs/profile.",
+        ),
+    ] = False,
+    incremental: Annotated[
+        bool,
+        typer.Option(
+            "--incremental",
+            help="Only translate files, pages and lines that changed since the last run (outputs/rpgmaker_manifest.json).",
+        ),
+    ] = False,
+):
     logger.info("Translating RPG Maker Data...")
     main_dir = pathlib.Path(__file__).resolve().parent
 
     files = list((main_dir / "inputs").glob("*.json"))
     output_folder = pathlib.Path("outputs")
     config = prepare_config(main_dir)
-    asyncio.run(process_rpgmaker(files, output_folder, config))
+    try:
+        asyncio.run(
+            process_rpgmaker(
+                files,
+                output_folder,
+                config,
+                resume=resume,
+                profile=profile,
+                incremental=incremental,
+            )
+        )
+    except KeyboardInterrupt:
+        logger.warning("Stopped by user.")
+        raise typer.Exit(130)
 
 
 @app.command(name="_")